@@ -0,0 +1,200 @@
+"""
+Bandwidth shaping for the Wallpaper Changer application.
+
+This module keeps image downloads from saturating metered or shared uplinks. A
+token bucket caps the throughput of background refills while data streams in,
+and a rolling 24 hour byte quota, shared by all runs, stops refills once the
+daily allowance is used up. Foreground downloads (a --change-now with no local
+images left) are never throttled and may overdraw the quota, so the user is
+not left without a wallpaper. Scheduled changes and the service download at
+background priority.
+
+Classes:
+    TokenBucket: Limits throughput to a number of bytes per second.
+    DailyQuota: Tracks bytes transferred over the last 24 hours.
+    BandwidthGovernor: Applies the throughput cap and quota to image downloads.
+"""
+
+import sqlite3
+import threading
+import time
+
+FOREGROUND = 'foreground'
+BACKGROUND = 'background'
+
+
+class TokenBucket:
+    """
+    A class to limit throughput to a fixed number of bytes per second.
+
+    Consumers may go into debt for one chunk and then sleep until the bucket
+    refills, so chunk sizes larger than the rate still make progress.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate (float): Allowed bytes per second. 0 disables the limit.
+            clock (callable): Monotonic time source, in seconds.
+            sleep (callable): Function used to wait for tokens.
+        """
+        self.rate = rate
+        self.capacity = rate  # Allow bursts of up to one second worth of data
+        self.tokens = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        Take `amount` bytes worth of tokens, sleeping if the bucket runs dry.
+
+        Args:
+            amount (int): Number of bytes about to be transferred.
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+
+
+class DailyQuota:
+    """
+    A class to track bytes transferred over a rolling 24 hour window.
+
+    Usage is kept in hourly buckets in a small SQLite database so that separate
+    runs share one allowance. Each save adds this process's new usage to the
+    stored counters in one transaction, so overlapping runs (a long refill and
+    a scheduled change) never overwrite each other's usage.
+    """
+
+    WINDOW = 24 * 3600
+    BUCKET = 3600
+
+    def __init__(self, path, limit, clock=time.time):
+        """
+        Initialize the quota and open the usage database.
+
+        Args:
+            path (str): The file path of the usage database.
+            limit (int): Allowed bytes per 24 hours. 0 disables the quota.
+            clock (callable): Wall clock time source, in seconds.
+        """
+        self.path = path
+        self.limit = limit
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = {}  # Bucket -> bytes recorded since the last save
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS usage (bucket INTEGER PRIMARY KEY, bytes INTEGER NOT NULL)")
+
+    def _oldest(self):
+        """Return the newest bucket that already fell out of the window."""
+        return int(self._clock() - self.WINDOW) // self.BUCKET
+
+    def used(self):
+        """Return the bytes transferred during the last 24 hours, by this and every other run."""
+        oldest = self._oldest()
+        with self._lock:
+            stored = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM usage WHERE bucket > ?",
+                                        (oldest,)).fetchone()[0]
+            return stored + sum(amount for bucket, amount in self._pending.items() if bucket > oldest)
+
+    def remaining(self):
+        """Return the bytes left in the allowance, or None if there is no quota."""
+        if self.limit <= 0:
+            return None
+        return max(self.limit - self.used(), 0)
+
+    def record(self, amount):
+        """
+        Add transferred bytes to the current hourly bucket.
+
+        Args:
+            amount (int): Number of bytes transferred.
+        """
+        bucket = int(self._clock()) // self.BUCKET
+        with self._lock:
+            self._pending[bucket] = self._pending.get(bucket, 0) + amount
+
+    def save(self):
+        """Add the usage recorded since the last save to the shared counters."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO usage (bucket, bytes) VALUES (?, ?) "
+                "ON CONFLICT (bucket) DO UPDATE SET bytes = bytes + excluded.bytes",
+                self._pending.items())
+            self._conn.execute("DELETE FROM usage WHERE bucket <= ?", (self._oldest(),))
+            self._pending.clear()
+
+    def close(self):
+        """Save pending usage and close the usage database."""
+        self.save()
+        with self._lock:
+            self._conn.close()
+
+
+class BandwidthGovernor:
+    """
+    A class to apply the throughput cap and the daily quota to image downloads.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize the governor from the configuration.
+
+        Args:
+            config (Config): Provides MAX_DOWNLOAD_KBPS, DAILY_QUOTA_MB and BANDWIDTH_USAGE_FILE.
+        """
+        self.bucket = TokenBucket(config.MAX_DOWNLOAD_KBPS * 1024)
+        self.quota = DailyQuota(config.BANDWIDTH_USAGE_FILE, int(config.DAILY_QUOTA_MB * 1024 * 1024))
+
+    def allows(self, priority):
+        """
+        Check whether a download of the given priority may start.
+
+        Args:
+            priority (str): FOREGROUND or BACKGROUND.
+
+        Returns:
+            bool: False if this is a background download and the daily quota is used up.
+        """
+        if priority == FOREGROUND:
+            return True
+        remaining = self.quota.remaining()
+        return remaining is None or remaining > 0
+
+    def shape(self, chunks, priority):
+        """
+        Pass download chunks through, throttling background downloads and counting usage.
+
+        Args:
+            chunks (iterable): The downloaded data as bytes objects.
+            priority (str): FOREGROUND or BACKGROUND.
+
+        Yields:
+            bytes: The chunks, unchanged.
+        """
+        try:
+            for chunk in chunks:
+                if priority == BACKGROUND:
+                    self.bucket.consume(len(chunk))
+                self.quota.record(len(chunk))
+                yield chunk
+        finally:
+            if self.quota.limit > 0:
+                self.quota.save()
+
+    def close(self):
+        """Save pending quota usage and release the usage database."""
+        self.quota.close()
@@ -15,14 +15,55 @@ import os
 class Config:
     """
     A class to store all configuration settings for the Wallpaper Changer application.
-    
+    """
+
     MIN_SCORE = 50
 
 
     WALLPAPER_CHANGE_INTERVAL = 120  # 1 hour in seconds
     IMAGE_FOLDER = os.path.join(os.path.dirname(__file__), 'images')
+    IMAGE_LIMIT = 100
+    MIN_RESOLUTION = (1920, 1080)  # Also the size previews are picked for instead of the original
+    MEASURE_RENDITION_SAVINGS = False  # HEAD the original of each rendition to log exact savings
     SUBREDDITS = ['EarthPorn', 'CityPorn', 'SpacePorn', 'Art']
 
+    # Reddit API endpoint; point this at reddit_simulator.py for offline load tests
+    REDDIT_BASE_URL = 'https://www.reddit.com'
+    REQUEST_TIMEOUT = 30  # Seconds to wait for a connection or the next chunk of data
+
+    # Bandwidth shaping for background refills; 0 disables a limit
+    MAX_DOWNLOAD_KBPS = 0
+    DAILY_QUOTA_MB = 0
+    BANDWIDTH_USAGE_FILE = os.path.join(os.path.dirname(__file__), 'bandwidth_usage.db')
+
+    # Interrupted downloads are kept here and resumed with HTTP Range requests
+    PARTIAL_FOLDER = os.path.join(os.path.dirname(__file__), 'partial_downloads')
+    PARTIAL_TTL = 24 * 3600  # Seconds without progress after which a partial download is discarded
+
+    # Posts and image URLs that did not yield an image are skipped until their cause expires
+    NEGATIVE_CACHE_FILE = os.path.join(os.path.dirname(__file__), 'negative_cache.db')
+    NEGATIVE_CACHE_TTLS = {  # Failure cause -> seconds; causes not listed (timeouts, 5xx) are retried
+        'not_image': 30 * 24 * 3600,  # Text posts, videos, albums and non-image content types
+        'removed': 30 * 24 * 3600,  # Images imgur replaced with its removed.png placeholder
+        'http_404': 7 * 24 * 3600,
+        'http_410': 30 * 24 * 3600,
+        'http_403': 24 * 3600,
+    }
+
+    # Image storage: 'folder' keeps one file per image, 'packed' appends images to large pack files
+    STORAGE_BACKEND = 'folder'
+    PACK_FOLDER = os.path.join(os.path.dirname(__file__), 'image_packs')
+    PACK_FILE_SIZE = 256 * 1024 * 1024  # Start a new pack file after 256 MB
+    PACK_COMPACT_RATIO = 0.5  # Compact a pack once half of its bytes belong to evicted images
+    DISPLAY_FOLDER = os.path.join(os.path.dirname(__file__), 'current_wallpaper')
+
+    # Weighted wallpaper selection; each storage backend keeps its own catalog
+    CATALOG_FILE = os.path.join(os.path.dirname(__file__), 'image_catalog.db')
+    PACKED_CATALOG_FILE = os.path.join(os.path.dirname(__file__), 'image_catalog_packed.db')
+    SUBREDDIT_PRIORITIES = {}  # Subreddit name -> weight multiplier, 1.0 when absent
+    RESHOW_WINDOW = 7 * 24 * 3600  # Seconds until a shown image regains its full weight
+    MIN_RECENCY_WEIGHT = 0.01  # Weight multiplier of an image that was just shown
+
     # OS-specific configurations
     WINDOWS_COMMAND = 'REG ADD "HKCU\Control Panel\Desktop" /v Wallpaper /t REG_SZ /d "{}" /f'
     MACOS_COMMAND = "osascript -e 'tell application \"Finder\" to set desktop picture to POSIX file \"{}\"'"
@@ -30,7 +71,46 @@ class Config:
 
     TASK_NAME = "WallpaperChanger"
 
-    def __init__(self):
-        """Initialize the Config class and create the image folder if it doesn't exist."""
-        if not os.path.exists(self.IMAGE_FOLDER):
+    PROFILE_FOLDER = os.path.join(os.path.dirname(__file__), 'profiles')
+
+    # Logging configuration
+    LOG_FILE = os.path.join(os.path.dirname(__file__), 'wallpaper_changer.log')
+    LOG_LEVEL = 'INFO'
+    LOG_JSON = False  # Write one JSON object per line instead of plain text
+    LOG_MAX_BYTES = 1024 * 1024  # Rotate the log file once it reaches 1 MB
+    LOG_BACKUP_COUNT = 3
+
+    # Files and folders the application writes to, see relocate()
+    DATA_PATHS = ('IMAGE_FOLDER', 'PACK_FOLDER', 'DISPLAY_FOLDER', 'CATALOG_FILE', 'PACKED_CATALOG_FILE',
+                  'BANDWIDTH_USAGE_FILE', 'PARTIAL_FOLDER', 'NEGATIVE_CACHE_FILE', 'PROFILE_FOLDER', 'LOG_FILE')
+
+    def __init__(self, data_folder=None):
+        """
+        Initialize the Config class and create the image folder if it doesn't exist.
+
+        Args:
+            data_folder (str): Keep all application data in this folder instead of
+                next to the application, see relocate(). Default is None.
+        """
+        if data_folder is not None:
+            self.relocate(data_folder)
+        elif not os.path.exists(self.IMAGE_FOLDER):
             os.makedirs(self.IMAGE_FOLDER)
+
+    def relocate(self, folder):
+        """
+        Point every file and folder the application writes to into `folder`.
+
+        Used by the tests and the load test, through Config(data_folder), so the real
+        image collection is never touched.
+
+        Args:
+            folder (str): The folder to keep all application data in.
+
+        Returns:
+            Config: This configuration, for chaining.
+        """
+        for attribute in self.DATA_PATHS:
+            setattr(self, attribute, os.path.join(folder, os.path.basename(getattr(Config, attribute))))
+        os.makedirs(self.IMAGE_FOLDER, exist_ok=True)
+        return self
@@ -0,0 +1,272 @@
+"""
+Image catalog for the Wallpaper Changer application.
+
+This module keeps per-image metadata (source subreddit, Reddit score and when
+the image was last shown) in a small SQLite database, so that a single row can
+be updated after each wallpaper change without rewriting the whole catalog.
+
+Each image also owns a slot in a Fenwick tree of selection weights that is
+stored in the same database. Adding, removing and drawing an image therefore
+take O(log n) queries, so a one-shot run does not have to load the catalog or
+list the image folder to pick a wallpaper.
+
+Classes:
+    ImageCatalog: Persists metadata and selection weights of downloaded images.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+
+from weighted_selector import FenwickTree
+
+
+class _TreeNodes:
+    """The internal array of a Fenwick tree, stored in the catalog database."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the node count, which another process may have changed."""
+        self._size = self._conn.execute("SELECT COALESCE(MAX(node), 0) FROM tree").fetchone()[0]
+
+    def __len__(self):
+        return self._size + 1
+
+    def __getitem__(self, node):
+        if node == 0:
+            return 0.0
+        return self._conn.execute("SELECT total FROM tree WHERE node = ?", (node,)).fetchone()[0]
+
+    def __setitem__(self, node, total):
+        self._conn.execute("UPDATE tree SET total = ? WHERE node = ?", (total, node))
+
+    def append(self, total):
+        self._size += 1
+        self._conn.execute("INSERT INTO tree (node, total) VALUES (?, ?)", (self._size, total))
+
+
+class ImageCatalog:
+    """
+    A class to persist metadata and selection weights of the images in the local collection.
+
+    Weights stored here do not include how recently an image was shown, which
+    changes with every passing second; callers apply that factor to the rows
+    returned by sample().
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the catalog database.
+
+        Args:
+            path (str): The file path of the SQLite database.
+        """
+        self._lock = threading.Lock()
+        # Other processes (a scheduled run next to a refill) may hold the write lock for a while
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "name TEXT PRIMARY KEY, subreddit TEXT, score INTEGER NOT NULL DEFAULT 0, "
+                "added REAL NOT NULL, last_shown REAL)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(images)")}
+            # Catalogs written before selection weights were persisted lack these columns
+            if 'slot' not in columns:
+                self._conn.execute("ALTER TABLE images ADD COLUMN slot INTEGER")
+                self._conn.execute("ALTER TABLE images ADD COLUMN weight REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS images_slot ON images (slot)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tree (node INTEGER PRIMARY KEY, total REAL NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._nodes = _TreeNodes(self._conn)
+        self._tree = FenwickTree(nodes=self._nodes)
+
+    def _begin(self, mode='IMMEDIATE'):
+        """
+        Start a transaction and refresh the cached tree size inside it.
+
+        Tree updates read nodes before writing them, so writers take the database
+        write lock up front; otherwise two processes could both append the same
+        node or overwrite each other's node totals.
+        """
+        self._conn.execute(f"BEGIN {mode}")
+        self._nodes.refresh()
+
+    def _take_slot(self):
+        """Return a free tree slot, growing the tree if none is left."""
+        row = self._conn.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        if row is None:
+            self._tree.append(0.0)
+            return len(self._tree) - 1
+        self._conn.execute("DELETE FROM free_slots WHERE slot = ?", row)
+        return row[0]
+
+    def add(self, name, subreddit, score=0, weight=0.0):
+        """
+        Record a newly downloaded image, replacing any previous entry of that name.
+
+        Args:
+            name (str): The image name.
+            subreddit (str): The subreddit the image came from.
+            score (int): The Reddit score of the post.
+            weight (float): The selection weight of the image, see ImageManager.image_weight.
+        """
+        weight = max(0.0, float(weight))
+        with self._lock, self._conn:
+            self._begin()
+            row = self._conn.execute("SELECT slot, weight FROM images WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] is not None:
+                slot = row[0]
+                self._tree.add(slot, weight - row[1])
+            else:
+                slot = self._take_slot()
+                self._tree.add(slot, weight)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (name, subreddit, score, added, last_shown, slot, weight) "
+                "VALUES (?, ?, ?, ?, NULL, ?, ?)", (name, subreddit, int(score or 0), time.time(), slot, weight))
+
+    def add_many(self, entries):
+        """
+        Record many images at once without weights.
+
+        The tree is marked stale, so the next rebuild_weights call recomputes all
+        weights in O(n) instead of updating the tree once per image.
+
+        Args:
+            entries (iterable): (name, subreddit, score) tuples of images not yet in the catalog.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._begin()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO images (name, subreddit, score, added, last_shown, slot, weight) "
+                "VALUES (?, ?, ?, ?, NULL, NULL, 0)",
+                ((name, subreddit, int(score or 0), now) for name, subreddit, score in entries))
+            self._conn.execute("DELETE FROM settings WHERE key = 'weights'")
+
+    def remove(self, names):
+        """
+        Remove images from the catalog.
+
+        Args:
+            names (iterable): The names of the images to remove.
+        """
+        with self._lock, self._conn:
+            self._begin()
+            for name in names:
+                row = self._conn.execute("SELECT slot, weight FROM images WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM images WHERE name = ?", (name,))
+                if row[0] is not None:
+                    self._tree.add(row[0], -row[1])
+                    self._conn.execute("INSERT INTO free_slots (slot) VALUES (?)", (row[0],))
+
+    def mark_shown(self, name, when=None):
+        """
+        Record that an image was just displayed.
+
+        Args:
+            name (str): The image name.
+            when (float): Unix timestamp of the display. Default is now.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE images SET last_shown = ? WHERE name = ?",
+                               (time.time() if when is None else when, name))
+
+    def entries(self):
+        """
+        Return all catalog entries.
+
+        Returns:
+            list: Tuples of (name, subreddit, score, added, last_shown).
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, subreddit, score, added, last_shown FROM images").fetchall()
+
+    def oldest(self, count):
+        """
+        Return the names of the images that were added first.
+
+        Args:
+            count (int): Maximum number of names to return.
+
+        Returns:
+            list: Image names, oldest first.
+        """
+        with self._lock:
+            return [name for (name,) in self._conn.execute(
+                "SELECT name FROM images ORDER BY added LIMIT ?", (max(count, 0),))]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def sample(self, rng=random):
+        """
+        Draw an image with probability proportional to its stored weight.
+
+        Args:
+            rng (random.Random): Source of randomness. Default is the random module.
+
+        Returns:
+            tuple: (name, subreddit, score, last_shown) of the drawn image, or None if no
+            image has a positive weight.
+        """
+        with self._lock, self._conn:
+            # A read transaction sees the tree of a single committed write
+            self._begin('DEFERRED')
+            total = self._tree.total()
+            if total <= 0:
+                return None
+            for _ in range(3):
+                slot = self._tree.find(rng.random() * total)
+                row = self._conn.execute(
+                    "SELECT name, subreddit, score, last_shown FROM images WHERE slot = ? AND weight > 0",
+                    (slot,)).fetchone()
+                # Accumulated floating point error can land on an empty slot; draw again
+                if row is not None:
+                    return row
+            return self._conn.execute(
+                "SELECT name, subreddit, score, last_shown FROM images WHERE weight > 0 "
+                "ORDER BY RANDOM() LIMIT 1").fetchone()
+
+    def rebuild_weights(self, weight, key):
+        """
+        Recompute every stored weight and rebuild the tree, unless it was built for `key`.
+
+        Args:
+            weight (callable): Maps (subreddit, score) to a selection weight.
+            key (str): Identifies the weight settings. The O(n) rebuild only runs when
+                it differs from the key of the last rebuild.
+
+        Returns:
+            bool: Whether the weights were rebuilt.
+        """
+        with self._lock, self._conn:
+            self._begin()
+            row = self._conn.execute("SELECT value FROM settings WHERE key = 'weights'").fetchone()
+            if row is not None and row[0] == key:
+                return False
+            rows = self._conn.execute("SELECT name, subreddit, score FROM images ORDER BY rowid").fetchall()
+            weights = [max(0.0, float(weight(subreddit, score))) for _name, subreddit, score in rows]
+            self._conn.execute("UPDATE images SET slot = NULL")
+            self._conn.executemany("UPDATE images SET slot = ?, weight = ? WHERE name = ?",
+                                   ((slot, w, name) for slot, ((name, _s, _c), w) in enumerate(zip(rows, weights))))
+            self._conn.execute("DELETE FROM tree")
+            self._conn.execute("DELETE FROM free_slots")
+            self._conn.executemany("INSERT INTO tree (node, total) VALUES (?, ?)",
+                                   enumerate(FenwickTree(weights).tree[1:], 1))
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('weights', ?)", (key,))
+            self._nodes.refresh()
+        return True
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -1,79 +1,450 @@
+import collections
+import html
+import itertools
+import json
+import math
 import os
 import random
+import threading
+import time
+from urllib.parse import urlparse
 import requests
 import logging
+from bandwidth import BACKGROUND, BandwidthGovernor
 from config import Config
+from image_catalog import ImageCatalog
+from image_store import create_image_store
+from negative_cache import NegativeCache
+from partial_downloads import PartialDownloads
+
+CHUNK_SIZE = 64 * 1024
+# Network reads stay small: bytes urllib3 holds for an unfinished chunk are lost when a connection drops
+READ_CHUNK_SIZE = 8 * 1024
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+# Hosts that serve images without a file extension; their content type is checked on download
+IMAGE_HOSTS = ('i.redd.it', 'i.imgur.com')
+# Upper bound on draws per selection; only reached when most images were shown very recently
+MAX_DRAWS = 100
+# imgur page links; single images have a direct i.imgur.com counterpart
+IMGUR_PAGE_HOSTS = ('imgur.com', 'www.imgur.com', 'm.imgur.com')
+# imgur serves these as videos, even from i.imgur.com
+VIDEO_EXTENSIONS = ('.gifv', '.mp4', '.webm')
+
+
+class UnusableImage(ValueError):
+    """Raised when a post or URL permanently yields no usable image."""
+
+    def __init__(self, cause, message):
+        super().__init__(message)
+        self.cause = cause
+
 
 class ImageManager:
     """
     A class to manage downloading and selecting images for wallpapers.
     """
 
-    def __init__(self):
-        """Initialize the ImageManager with configuration and track used images."""
-        self.config = Config()
-        self.used_images = set()
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    def __init__(self, config=None):
+        """
+        Initialize the ImageManager with configuration, image storage and the image catalog.
+
+        Args:
+            config (Config): Shared configuration. A default Config is created if omitted.
+        """
+        self.config = config or Config()
+        self.store = create_image_store(self.config)
+        self.governor = BandwidthGovernor(self.config)
+        self.partials = PartialDownloads(self.config.PARTIAL_FOLDER, self.config.PARTIAL_TTL)
+        # The catalog mirrors the active store, which reconcile_catalog enforces by
+        # dropping entries the store lacks; sharing one would wipe the other backend's.
+        self.catalog = ImageCatalog(self.config.PACKED_CATALOG_FILE if self.config.STORAGE_BACKEND == 'packed'
+                                    else self.config.CATALOG_FILE)
+        self.negative_cache = NegativeCache(self.config.NEGATIVE_CACHE_FILE, self.config.NEGATIVE_CACHE_TTLS)
+        self._catalog_synced = False
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self.rate_limited_until = 0.0
+        self._in_flight = set()
 
     def download_images(self, count=10):
         """
         Download multiple images from random subreddits specified in the configuration.
+
+        The catalog is reconciled with the stored images and interrupted downloads
+        from earlier attempts are resumed first. Gallery and crosspost submissions
+        can yield several images per API call, so this stops once `count` images
+        were stored or `count` API calls were made. All images of the last post are
+        kept, so up to one gallery's worth more than `count` may be returned.
+
         Args:
             count (int): Number of images to download. Default is 10.
         Returns:
-            list: List of file paths of the downloaded images.
-        """
-        downloaded_images = []
-        for _ in range(count):
-            image_path = self.download_image()
-            if image_path:
-                downloaded_images.append(image_path)
-                logging.info(f"Downloaded image: {image_path}")
+            list: The downloaded images, as returned by download_post_images.
+        """
+        self.reconcile_catalog()
+        downloaded_images = self.resume_partial_downloads()
+        api_calls = 0
+        while len(downloaded_images) < count and api_calls < count:
+            if not self.governor.allows(BACKGROUND):
+                logging.warning("Daily download quota used up, stopping the refill",
+                                extra={'event': 'quota_exhausted'})
+                break
+            api_calls += 1
+            for image in self.download_post_images():
+                downloaded_images.append(image)
+                logging.info(f"Downloaded image: {image['url']}")
+        logging.info(f"Harvested {len(downloaded_images)} image(s) from {api_calls} API call(s), "
+                     f"{len(downloaded_images) / max(api_calls, 1):.2f} per call",
+                     extra={'event': 'harvest', 'images': len(downloaded_images), 'api_calls': api_calls})
+        self.clean_images()
         return downloaded_images
 
-    def download_image(self):
+    def download_image(self, priority=BACKGROUND):
         """
         Download an image from a random subreddit specified in the configuration.
+        Args:
+            priority (str): FOREGROUND when the user is waiting for a wallpaper, BACKGROUND otherwise.
+        Returns:
+            dict: The stored image name, its storage location and post score, or None if download fails.
+        """
+        images = self.resume_partial_downloads(priority, limit=1) or self.download_post_images(priority)
+        return images[0] if images else None
+
+    def download_post_images(self, priority=BACKGROUND):
+        """
+        Fetch a random post from a random configured subreddit and download all of its images.
+
+        Direct image links yield one image, galleries one image per item and
+        crossposts the images of the original post. Posts and URLs in the negative
+        cache are skipped without requesting any image. Background downloads are
+        throttled to MAX_DOWNLOAD_KBPS and skipped once the daily quota is used up.
+
+        Args:
+            priority (str): FOREGROUND when the user is waiting for a wallpaper, BACKGROUND otherwise.
+
         Returns:
-            str: The file path of the downloaded image, or None if download fails.
+            list: Dicts with the stored image name, its storage location and post score.
         """
         subreddit = random.choice(self.config.SUBREDDITS)
-        url = f"https://www.reddit.com/r/{subreddit}/random.json"
+        url = f"{self.config.REDDIT_BASE_URL}/r/{subreddit}/random.json"
         headers = {'User-agent': 'WallpaperChanger Bot 1.0'}
-        
+
+        if time.time() < self.rate_limited_until:
+            self._count('failed:rate_limited')
+            logging.warning(f"Skipping r/{subreddit}: rate limited for another "
+                            f"{self.rate_limited_until - time.time():.0f}s")
+            return []
+
+        if not self.governor.allows(priority):
+            self._count('failed:quota_exhausted')
+            logging.warning(f"Skipping r/{subreddit}: daily download quota used up")
+            return []
+
         try:
-            response = requests.get(url, headers=headers)
+            self._count('api_calls')
+            response = requests.get(url, headers=headers, timeout=self.config.REQUEST_TIMEOUT)
+            if response.status_code == 429:
+                self._note_rate_limit(response)
             response.raise_for_status()
-            data = response.json()
-            post_data = self.extract_post_data(data)
-            image_url = post_data['url']
-            score = post_data['score']
-            # Check if the URL ends with an image extension
-            if not image_url.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                # If it's an imgur link without an extension, append .jpg
-                if 'imgur.com' in image_url:
-                    image_url += '.jpg'
-                else:
-                    raise ValueError("Not a direct image link")
+            post_data = self.extract_post_data(response.json())
+            # Posts without an id cannot be told apart, so they are never cached
+            post_key = NegativeCache.post_key(post_data['id']) if post_data.get('id') else None
+            cause = self.negative_cache.lookup(post_key) if post_key else None
+            if cause:
+                self._count('negative_cache_hits')
+                logging.info(f"Skipping known {cause} post {post_data.get('id')} from r/{subreddit}",
+                             extra={'event': 'negative_cache_hit', 'subreddit': subreddit, 'cause': cause})
+                return []
+            candidates = self.extract_image_candidates(post_data)
+            if not candidates:
+                raise UnusableImage('not_image', "Not a direct image link")
+        except (requests.RequestException, ValueError, KeyError) as e:
+            cause = self._failure_cause(e)
+            self._count(f"failed:{cause}")
+            if isinstance(e, UnusableImage) and post_key:
+                self.negative_cache.add(post_key, cause)
+            logging.error(f"Error fetching a post from r/{subreddit}: {e}",
+                          extra={'event': 'download_failed', 'subreddit': subreddit,
+                                 'error': type(e).__name__})
+            return []
 
-            image_name = f"{subreddit}_{len(os.listdir(self.config.IMAGE_FOLDER)) + 1}.jpg"
-            image_path = os.path.join(self.config.IMAGE_FOLDER, image_name)
+        downloaded = []
+        for candidate in candidates:
+            image = self._download_candidate(subreddit, post_data.get('score', 0), candidate, priority)
+            if image:
+                downloaded.append(image)
+        if not downloaded and post_key:
+            # Remember posts whose every image failed permanently
+            causes = {self.negative_cache.lookup(NegativeCache.url_key(c['url'])) for c in candidates}
+            if len(causes) == 1 and None not in causes:
+                self.negative_cache.add(post_key, causes.pop())
+        return downloaded
+
+    def _download_candidate(self, subreddit, score, candidate, priority=BACKGROUND):
+        """
+        Download one image candidate into the image store.
 
-            image_response = requests.get(image_url)
-            image_response.raise_for_status()
+        Args:
+            subreddit (str): The subreddit the post was fetched from.
+            score (int): The Reddit score of the post.
+            candidate (dict): A candidate returned by extract_image_candidates.
+            priority (str): FOREGROUND or BACKGROUND, see download_post_images.
 
-            with open(image_path, 'wb') as f:
-                f.write(image_response.content)
+        Returns:
+            dict: The stored image name, its storage location and post score, or None if download fails.
+        """
+        image_url = candidate['url']
+        # Naming by post (and gallery item) id avoids listing the image folder and re-downloads
+        image_name = f"{subreddit}_{candidate['id']}.jpg"
+        if image_name in self.store:
+            self.partials.discard(image_name)
+            self._count('duplicates')
+            return None
+        url_key = NegativeCache.url_key(image_url)
+        if self.negative_cache.lookup(url_key):
+            self.partials.discard(image_name)
+            self._count('negative_cache_hits')
+            return None
+        with self._stats_lock:
+            # The same post can be drawn by two threads at once; let only one download it
+            if image_name in self._in_flight:
+                self.stats['duplicates'] += 1
+                return None
+            self._in_flight.add(image_name)
+        start = time.perf_counter()
 
-            
-            return {"url": image_path, "score": score}
+        try:
+            size, transferred = self._fetch(image_name, subreddit, score, candidate, priority)
+            self.catalog.add(image_name, subreddit, score, self.image_weight(subreddit, score))
 
+            logging.info(f"Fetched {image_url} from r/{subreddit}",
+                         extra={'event': 'download', 'subreddit': subreddit, 'url': image_url,
+                                'bytes': size, 'transferred': transferred,
+                                'duration_ms': round((time.perf_counter() - start) * 1000, 1)})
+            if candidate['rendition']:
+                self._log_rendition_savings(candidate['rendition'], candidate['original_url'], size)
+            self._count('images')
+            self._count('bytes', transferred)
+            return {"name": image_name, "url": self.store.location(image_name), "score": score}
 
-            #return image_path
-        
-        except (requests.RequestException, ValueError, KeyError) as e:
-            logging.error(f"Error downloading image from r/{subreddit}: {e}")
+        except (requests.RequestException, ValueError, OSError) as e:
+            cause = self._failure_cause(e)
+            self._count(f"failed:{cause}")
+            if self.negative_cache.add(url_key, cause):
+                self.partials.discard(image_name)
+            logging.error(f"Error downloading image from r/{subreddit}: {e}",
+                          extra={'event': 'download_failed', 'subreddit': subreddit, 'url': image_url,
+                                 'error': type(e).__name__,
+                                 'duration_ms': round((time.perf_counter() - start) * 1000, 1)})
             return None
+        finally:
+            with self._stats_lock:
+                self._in_flight.discard(image_name)
+
+    def _fetch(self, image_name, subreddit, score, candidate, priority, resume=True):
+        """
+        Stream an image into the store, resuming an earlier attempt if possible.
+
+        The response streams straight into the store. Only when the transfer
+        fails are the bytes received so far kept as a partial download. A kept
+        partial download is resumed with Range and If-Range, and when the server
+        answers with the full body instead (no range support or the image
+        changed) the download starts over. Partial data is only kept for servers
+        that accept ranges and send a strong ETag or a Last-Modified date.
+
+        Args:
+            image_name (str): The name to store the image under.
+            subreddit (str): The subreddit the post was fetched from.
+            score (int): The Reddit score of the post.
+            candidate (dict): A candidate returned by extract_image_candidates.
+            priority (str): FOREGROUND or BACKGROUND, see download_post_images.
+            resume (bool): Whether a kept partial download may be resumed.
+
+        Returns:
+            tuple: The total size of the image and the bytes transferred by this attempt.
+        """
+        url = candidate['url']
+        path = self.partials.data_path(image_name)
+        headers = {}
+        offset = 0
+        meta = self.partials.get(image_name) if resume else None
+        if meta and meta['url'] == url and self.partials.size(image_name):
+            offset = self.partials.size(image_name)
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = meta['validator']
+
+        response = requests.get(url, headers=headers, stream=True, timeout=self.config.REQUEST_TIMEOUT)
+        with response:
+            if response.status_code == 416 and offset:
+                # The kept bytes do not fit the current image; start over
+                self.partials.discard(image_name)
+                return self._fetch(image_name, subreddit, score, candidate, priority, resume=False)
+            response.raise_for_status()
+            if response.history and urlparse(response.url).path == '/removed.png':
+                # imgur redirects deleted images to a placeholder instead of answering 404
+                raise UnusableImage('removed', f"Image was removed: {url}")
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                raise UnusableImage('not_image', f"Not an image: {content_type or 'no content type'}")
+
+            if response.status_code == 206 and offset:
+                if not response.headers.get('Content-Range', '').startswith(f"bytes {offset}-"):
+                    self.partials.discard(image_name)
+                    raise ValueError(f"Unexpected Content-Range: {response.headers.get('Content-Range')}")
+                self._count('resumed')
+                self._count('bytes_resumed', offset)
+            else:
+                offset = 0
+            length = response.headers.get('Content-Length')
+            expected = offset + int(length) if length and length.isdigit() else None
+
+            etag = response.headers.get('ETag', '')
+            validator = (etag if etag and not etag.startswith('W/') else None) or response.headers.get('Last-Modified')
+            resumable = bool(validator) and (response.status_code == 206
+                                             or response.headers.get('Accept-Ranges') == 'bytes')
+
+            chunks = self.governor.shape(response.iter_content(chunk_size=READ_CHUNK_SIZE), priority)
+            if offset:
+                chunks = itertools.chain(self._file_chunks(path), chunks)
+            try:
+                size = self.store.put(image_name, self._checked_length(chunks, expected),
+                                      partial_path=path if resumable else None)
+            except (requests.RequestException, ValueError, OSError):
+                if resumable:
+                    self.partials.save(image_name, {'url': url, 'validator': validator, 'subreddit': subreddit,
+                                                    'score': score, 'candidate': candidate})
+                else:
+                    self.partials.discard(image_name)
+                raise
+        if meta is not None:
+            self.partials.discard(image_name)
+        return size, size - offset
+
+    @staticmethod
+    def _file_chunks(path):
+        """Yield the contents of a file in chunks; the file is closed once they are exhausted."""
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+    @staticmethod
+    def _checked_length(chunks, expected):
+        """Pass chunks through and fail before the store commits if fewer or more bytes than expected arrived."""
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        if expected is not None and size != expected:
+            raise ValueError(f"Incomplete download: {size} of {expected} bytes")
+
+    def resume_partial_downloads(self, priority=BACKGROUND, limit=None):
+        """
+        Finish downloads that were interrupted in earlier attempts.
+
+        Expired partial downloads are discarded first.
+
+        Args:
+            priority (str): FOREGROUND or BACKGROUND, see download_post_images.
+            limit (int): Maximum number of downloads to resume. Default is all of them.
+
+        Returns:
+            list: The completed images, as returned by download_post_images.
+        """
+        completed = []
+        for meta in self.partials.pending()[:limit]:
+            if not self.governor.allows(priority):
+                break
+            image = self._download_candidate(meta['subreddit'], meta['score'], meta['candidate'], priority)
+            if image:
+                completed.append(image)
+        return completed
+
+    def extract_image_candidates(self, post_data):
+        """
+        List the images a post links to.
+
+        Args:
+            post_data (dict): The post data from the Reddit API.
+
+        Returns:
+            list: Dicts with a unique `id` for naming, the `url` to download, the
+            `original_url` and the chosen preview `rendition` (or None).
+        """
+        if post_data.get('crosspost_parent_list'):
+            candidates = []
+            for parent in post_data['crosspost_parent_list']:
+                candidates.extend(self.extract_image_candidates(parent))
+            return candidates
+
+        if post_data.get('media_metadata'):
+            return self._gallery_candidates(post_data)
+
+        if post_data.get('is_self') or post_data.get('is_video'):
+            return []
+        original_url = post_data.get('url') or ''
+        parsed = urlparse(original_url)
+        domain = parsed.netloc.lower()
+        if domain in IMGUR_PAGE_HOSTS:
+            # Only single images have a direct i.imgur.com counterpart; albums need the imgur API
+            image_id, extension = os.path.splitext(parsed.path.strip('/'))
+            if not image_id or '/' in image_id or extension.lower() in VIDEO_EXTENSIONS:
+                return []
+            # Keep the extension the post linked to; i.imgur.com serves any image under .jpg otherwise
+            extension = extension if extension.lower() in IMAGE_EXTENSIONS else '.jpg'
+            original_url = f"https://i.imgur.com/{image_id}{extension}"
+        elif parsed.path.lower().endswith(VIDEO_EXTENSIONS) or not (
+                parsed.path.lower().endswith(IMAGE_EXTENSIONS) or domain in IMAGE_HOSTS
+                or post_data.get('post_hint') == 'image'):
+            return []
+
+        rendition = self.select_rendition(post_data)
+        return [{'id': post_data['id'], 'url': rendition['url'] if rendition else original_url,
+                 'original_url': original_url, 'rendition': rendition}]
+
+    def _gallery_candidates(self, post_data):
+        """List the images of a gallery post in gallery order."""
+        media = post_data['media_metadata']
+        items = (post_data.get('gallery_data') or {}).get('items')
+        media_ids = [item['media_id'] for item in items] if items else list(media)
+        candidates = []
+        for media_id in media_ids:
+            meta = media.get(media_id) or {}
+            source = meta.get('s') or {}
+            if meta.get('status') != 'valid' or meta.get('e') != 'Image' or not source.get('u'):
+                continue
+            variants = [{'url': v['u'], 'width': v['x'], 'height': v['y']} for v in meta.get('p', []) + [source]
+                        if 'u' in v]
+            rendition = self._smallest_sufficient(variants, source['x'], source['y'])
+            original_url = html.unescape(source['u'])
+            if rendition and rendition['url'] == original_url:
+                rendition = None
+            candidates.append({'id': f"{post_data['id']}_{media_id}",
+                               'url': rendition['url'] if rendition else original_url,
+                               'original_url': original_url, 'rendition': rendition})
+        return candidates
+
+    def _count(self, key, amount=1):
+        """Increment a download statistics counter."""
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    @staticmethod
+    def _failure_cause(error):
+        """Return a short, aggregatable description of a download failure."""
+        response = getattr(error, 'response', None)
+        if isinstance(error, UnusableImage):
+            return error.cause
+        if isinstance(error, requests.HTTPError) and response is not None:
+            return f"http_{response.status_code}"
+        return type(error).__name__
+
+    def _note_rate_limit(self, response):
+        """Stop calling the API until the rate limit window announced by Reddit has passed."""
+        reset = response.headers.get('Retry-After') or response.headers.get('X-Ratelimit-Reset')
+        try:
+            delay = float(reset)
+        except (TypeError, ValueError):
+            delay = 60.0
+        self.rate_limited_until = max(self.rate_limited_until, time.time() + delay)
 
     def extract_post_data(self, data):
         """Extract post data from the Reddit API response."""
@@ -84,28 +455,214 @@ class ImageManager:
         else:
             raise ValueError("Unexpected Reddit API response format")
 
+    def select_rendition(self, post_data):
+        """
+        Pick the smallest Reddit preview rendition that still covers the target resolution.
+
+        Reddit lists scaled copies of an image under `preview.images[].resolutions`
+        and a full-size re-encode under `source`. Animated GIFs keep their original,
+        because previews are still frames.
+
+        Args:
+            post_data (dict): The post data from the Reddit API.
+
+        Returns:
+            dict: The rendition's url, width and height plus the source width and height,
+            or None if no rendition is at least MIN_RESOLUTION and the original should be used.
+        """
+        if post_data.get('url', '').lower().endswith('.gif'):
+            return None
+        images = (post_data.get('preview') or {}).get('images') or []
+        if not images or 'source' not in images[0]:
+            return None
+        source = images[0]['source']
+        return self._smallest_sufficient(images[0].get('resolutions', []) + [source],
+                                         source['width'], source['height'])
+
+    def _smallest_sufficient(self, variants, source_width, source_height):
+        """Return the smallest variant covering MIN_RESOLUTION, or None if there is none."""
+        min_width, min_height = self.config.MIN_RESOLUTION
+        candidates = [v for v in variants
+                      if v.get('width', 0) >= min_width and v.get('height', 0) >= min_height and v.get('url')]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda v: v['width'] * v['height'])
+        return {'url': html.unescape(best['url']), 'width': best['width'], 'height': best['height'],
+                'source_width': source_width, 'source_height': source_height}
+
+    def _log_rendition_savings(self, rendition, original_url, size):
+        """
+        Log the bytes saved by downloading a rendition instead of the original.
+
+        Only with MEASURE_RENDITION_SAVINGS (used by the load test) is the
+        original's size measured with a HEAD request, which costs an extra round
+        trip per image; the result is counted as `bytes_saved`. Otherwise it is
+        estimated from the ratio of pixel counts and counted as
+        `bytes_saved_estimated`. That ratio says nothing about Reddit's
+        re-encoding, so a full-size rendition is logged with unknown savings.
+        """
+        summary = f"Downloaded {rendition['width']}x{rendition['height']} rendition of a " \
+                  f"{rendition['source_width']}x{rendition['source_height']} image"
+        fields = {'event': 'rendition', 'bytes': size,
+                  'width': rendition['width'], 'height': rendition['height']}
+        original_size = None
+        if self.config.MEASURE_RENDITION_SAVINGS:
+            try:
+                head = requests.head(original_url, allow_redirects=True, timeout=self.config.REQUEST_TIMEOUT)
+                if head.ok and head.headers.get('Content-Length'):
+                    original_size = int(head.headers['Content-Length'])
+            except (requests.RequestException, ValueError):
+                pass
+        if original_size is not None:
+            saved = max(original_size - size, 0)
+            self._count('bytes_saved', saved)
+            logging.info(f"{summary}, saved {saved} bytes", extra=dict(fields, bytes_saved=saved))
+            return
+        ratio = (rendition['source_width'] * rendition['source_height']) / (rendition['width'] * rendition['height'])
+        if ratio <= 1.0:
+            logging.info(f"{summary}, savings unknown", extra=fields)
+            return
+        saved = int(size * ratio) - size
+        self._count('bytes_saved_estimated', saved)
+        logging.info(f"{summary}, saved about {saved} bytes", extra=dict(fields, bytes_saved_estimated=saved))
+
+    def image_weight(self, subreddit, score):
+        """
+        Compute the stored selection weight of an image.
+
+        Higher-scored posts and subreddits with a higher priority are favored.
+
+        Args:
+            subreddit (str): The subreddit the image came from.
+            score (int): The Reddit score of the post.
+
+        Returns:
+            float: The non-negative selection weight.
+        """
+        score_factor = 1.0 + math.log1p(max(score or 0, 0))
+        priority = self.config.SUBREDDIT_PRIORITIES.get(subreddit, 1.0)
+        return score_factor * max(priority, 0.0)
+
+    def recency(self, last_shown, now=None):
+        """
+        Compute how far an image has regained its full weight since it was last shown.
+
+        Args:
+            last_shown (float): Unix timestamp of the last display, or None if never shown.
+            now (float): The current Unix timestamp. Default is now.
+
+        Returns:
+            float: A factor between MIN_RECENCY_WEIGHT and 1.0, reaching 1.0 after RESHOW_WINDOW seconds.
+        """
+        if last_shown is None:
+            return 1.0
+        age = (time.time() if now is None else now) - last_shown
+        return min(1.0, max(self.config.MIN_RECENCY_WEIGHT, age / self.config.RESHOW_WINDOW))
+
+    def _sync_catalog(self):
+        """Rebuild stored weights after the weight settings changed, and adopt images into an empty catalog."""
+        if self._catalog_synced:
+            return
+        if not len(self.catalog):
+            self.reconcile_catalog()
+        self.catalog.rebuild_weights(self.image_weight, self._weights_key())
+        self._catalog_synced = True
+
+    def _weights_key(self):
+        """Identify the settings stored weights depend on, so the catalog knows when to rebuild them."""
+        return json.dumps({'version': 1, 'priorities': self.config.SUBREDDIT_PRIORITIES}, sort_keys=True)
+
+    def reconcile_catalog(self):
+        """
+        Match the catalog with the stored images.
+
+        This lists the whole store, so it runs with background refills rather than
+        on every wallpaper change; files missing at selection time are dropped lazily.
+
+        Returns:
+            int: The number of catalog entries added or removed.
+        """
+        files = self.store.names()
+        known = {entry[0] for entry in self.catalog.entries()}
+        stale = known - files
+        if stale:
+            self.catalog.remove(stale)
+        # Images placed in the folder by hand or by older versions have no catalog entry yet.
+        if files - known:
+            self.catalog.add_many((name, name.rsplit('_', 1)[0], 0) for name in files - known)
+            self.catalog.rebuild_weights(self.image_weight, self._weights_key())
+        return len(stale) + len(files - known)
+
     def get_random_image(self):
         """
-        Select a random image from the local collection, avoiding recent duplicates.
+        Select a weighted random image from the local collection.
+
+        Favorite subreddits, higher-scored posts and images that have not been
+        shown for a long time are more likely to be picked. Images are drawn by
+        their stored weight in O(log n) and a recently shown image is accepted with
+        probability equal to its recency factor, which is equivalent to drawing by
+        weight times recency without rewriting weights as time passes.
+
         Returns:
-            str: The file path of the selected image, or None if no images are available.
-        """
-        available_images = set(os.listdir(self.config.IMAGE_FOLDER)) - self.used_images
-        if not available_images:
-            self.used_images.clear()
-            available_images = set(os.listdir(self.config.IMAGE_FOLDER))
-
-        if available_images:
-            chosen_image = random.choice(list(available_images))
-            self.used_images.add(chosen_image)
-            logging.info(f"Selected image: {chosen_image}")
-            return os.path.join(self.config.IMAGE_FOLDER, chosen_image)
-        else:
+            str: A file path of the selected image that can be set as the wallpaper,
+            or None if no images are available.
+        """
+        self._sync_catalog()
+        now = time.time()
+        chosen_image = None
+        for _ in range(MAX_DRAWS):
+            drawn = self.catalog.sample()
+            if drawn is None:
+                break
+            name, _subreddit, _score, last_shown = drawn
+            if name not in self.store:
+                # The file was removed behind our back; drop it and draw again.
+                self.catalog.remove([name])
+                continue
+            chosen_image = name
+            if random.random() < self.recency(last_shown, now):
+                break
+
+        if chosen_image is None:
             logging.warning("No images available")
             return None
+        self.catalog.mark_shown(chosen_image, now)
+        logging.info(f"Selected image: {chosen_image}")
+        return self.store.display_path(chosen_image)
 
+    def display_path(self, image_name):
+        """
+        Mark a stored image as shown and return a file path to set as the wallpaper.
 
-    viewer.run()
+        Args:
+            image_name (str): The name of the stored image.
 
+        Returns:
+            str: The file path of the image.
+        """
+        self.catalog.mark_shown(image_name)
+        return self.store.display_path(image_name)
+
+    def clean_images(self):
+        """
+        Evict the oldest images beyond IMAGE_LIMIT.
+
+        Returns:
+            int: The number of evicted images.
+        """
+        excess = len(self.catalog) - self.config.IMAGE_LIMIT
+        if excess <= 0:
+            return 0
+        evicted = self.catalog.oldest(excess)
+        self.store.delete(evicted)
+        self.catalog.remove(evicted)
+        logging.info(f"Evicted {len(evicted)} image(s) over the limit of {self.config.IMAGE_LIMIT}",
+                     extra={'event': 'evict', 'count': len(evicted)})
+        return len(evicted)
 
-  
+    def close(self):
+        """Wait for background storage work and release the catalog, negative cache, quota and store."""
+        self.store.close()
+        self.governor.close()
+        self.catalog.close()
+        self.negative_cache.close()
@@ -0,0 +1,497 @@
+"""
+Image storage backends for the Wallpaper Changer application.
+
+This module decides where downloaded images live. The folder backend keeps one
+file per image, as the application always did. The packed backend appends
+images to a few large pack files with an SQLite offset index, reads them back
+through mmap and reclaims space left by evicted images in a background thread,
+which keeps shared and network home directories free of thousands of small files.
+
+Functions:
+    create_image_store(config): Create the storage backend selected in the configuration.
+
+Classes:
+    FolderImageStore: Stores each image as a separate file.
+    PackedImageStore: Stores images inside large append-only pack files.
+"""
+
+import contextlib
+import logging
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def create_image_store(config):
+    """
+    Create the storage backend selected in the configuration.
+
+    Args:
+        config (Config): The application configuration.
+
+    Returns:
+        FolderImageStore or PackedImageStore: The image store.
+
+    Raises:
+        ValueError: If STORAGE_BACKEND names an unknown backend.
+    """
+    if config.STORAGE_BACKEND == 'folder':
+        return FolderImageStore(config.IMAGE_FOLDER)
+    if config.STORAGE_BACKEND == 'packed':
+        return PackedImageStore(config.PACK_FOLDER, config.DISPLAY_FOLDER,
+                                config.PACK_FILE_SIZE, config.PACK_COMPACT_RATIO)
+    raise ValueError(f"Unknown storage backend: {config.STORAGE_BACKEND}")
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on `path` that other processes respect."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FolderImageStore:
+    """
+    A class to store each image as a separate file in a folder.
+    """
+
+    def __init__(self, folder):
+        """
+        Initialize the store.
+
+        Args:
+            folder (str): The folder holding the images.
+        """
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.folder, name))
+
+    def names(self):
+        """Return the set of stored image names."""
+        return {n for n in os.listdir(self.folder) if not n.endswith('.part')}
+
+    def location(self, name):
+        """Return a human readable description of where an image is stored."""
+        return os.path.join(self.folder, name)
+
+    def put(self, name, chunks, partial_path=None):
+        """
+        Store an image, replacing any image of the same name.
+
+        The data only becomes visible once every chunk was written, so an
+        interrupted download never leaves a truncated image behind.
+
+        Args:
+            name (str): The image name.
+            chunks (iterable): The image data as a sequence of bytes objects.
+            partial_path (str): Where to keep the bytes written so far if the chunks
+                raise, so the download can be resumed. By default they are discarded.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        path = os.path.join(self.folder, name)
+        temp_path = path + '.part'
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                if partial_path:
+                    # A rename on the same volume, so the partial data is not copied again
+                    shutil.move(temp_path, partial_path)
+                else:
+                    os.remove(temp_path)
+            raise
+        return size
+
+    def read(self, name):
+        """Return the bytes of a stored image."""
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            return f.read()
+
+    def delete(self, names):
+        """
+        Delete images from the store.
+
+        Args:
+            names (iterable): The names of the images to delete.
+        """
+        for name in names:
+            path = os.path.join(self.folder, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def display_path(self, name):
+        """
+        Return a real file path that can be set as the wallpaper.
+
+        Args:
+            name (str): The image name.
+
+        Returns:
+            str: The file path of the image.
+        """
+        return os.path.join(self.folder, name)
+
+    def close(self):
+        """Release resources held by the store."""
+
+
+class PackedImageStore:
+    """
+    A class to store images inside large append-only pack files.
+
+    Each image is a byte range of a pack file. Deleting an image only removes its
+    index row; once a pack holds more than `compact_ratio` dead bytes its live
+    images are copied to the current pack and the old pack is removed.
+
+    Downloads are spooled to a temporary file first, so the store lock is only
+    held while a complete image is copied into a pack. Pack files are also
+    guarded by a file lock, as a scheduled run may write while a refill started
+    by --start is still running.
+    """
+
+    def __init__(self, folder, display_folder, pack_size=256 * 1024 * 1024, compact_ratio=0.5):
+        """
+        Open (and create if needed) the pack folder and its index.
+
+        Args:
+            folder (str): The folder holding the pack files and index.
+            display_folder (str): The folder the displayed wallpaper is exported to.
+            pack_size (int): Size in bytes after which a new pack file is started.
+            compact_ratio (float): Fraction of dead bytes that triggers compaction of a pack.
+        """
+        self.folder = folder
+        self.display_folder = display_folder
+        self.pack_size = pack_size
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._maps = {}
+        self._retired = set()
+        self._compactor = None
+        os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(folder, 'index.db'), check_same_thread=False)
+        self._discard_stale_spools()
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "name TEXT PRIMARY KEY, pack INTEGER NOT NULL, "
+                "offset INTEGER NOT NULL, length INTEGER NOT NULL)")
+
+    def _discard_stale_spools(self, max_age=24 * 3600):
+        """Remove temporary download files left behind by processes that crashed."""
+        cutoff = time.time() - max_age
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            if filename.startswith('incoming_') and filename.endswith('.part'):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass  # Removed by another process in the meantime
+
+    def __contains__(self, name):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+
+    @contextlib.contextmanager
+    def _packs_locked(self):
+        """Hold the store lock and, once per thread, the cross-process pack lock."""
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with _file_lock(os.path.join(self.folder, 'packs.lock')):
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    def _pack_path(self, pack):
+        return os.path.join(self.folder, f"pack_{pack:05d}.pack")
+
+    def _pack_ids(self):
+        ids = []
+        for filename in os.listdir(self.folder):
+            if filename.startswith('pack_') and filename.endswith('.pack'):
+                ids.append(int(filename[5:-5]))
+        return sorted(ids)
+
+    def _writable_pack(self):
+        """Return the id of the pack new data should be appended to."""
+        ids = self._pack_ids()
+        if ids and ids[-1] not in self._retired and os.path.getsize(self._pack_path(ids[-1])) < self.pack_size:
+            return ids[-1]
+        return ids[-1] + 1 if ids else 1
+
+    def names(self):
+        """Return the set of stored image names."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT name FROM entries")}
+
+    def location(self, name):
+        """Return a human readable description of where an image is stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pack, offset FROM entries WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return f"{self._pack_path(row[0])}@{row[1]}"
+
+    def put(self, name, chunks, partial_path=None):
+        """
+        Append an image to the current pack, replacing any image of the same name.
+
+        The chunks are written to a temporary file without holding any lock, so
+        slow or throttled downloads neither block readers nor each other. Only a
+        complete image is appended and indexed; an interrupted download never
+        touches the packs.
+
+        Args:
+            name (str): The image name.
+            chunks (iterable): The image data as a sequence of bytes objects.
+            partial_path (str): Where to keep the bytes written so far if the chunks
+                raise, so the download can be resumed. By default they are discarded.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        fd, temp_path = tempfile.mkstemp(prefix='incoming_', suffix='.part', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except BaseException:
+            if partial_path:
+                # A rename on the same volume, so the partial data is not copied again
+                shutil.move(temp_path, partial_path)
+            else:
+                os.remove(temp_path)
+            raise
+        try:
+            length, replaced = self._append(name, self._file_chunks(temp_path))
+        finally:
+            os.remove(temp_path)
+        if replaced:
+            self._maybe_compact()
+        return length
+
+    @staticmethod
+    def _file_chunks(path, size=1024 * 1024):
+        """Yield the contents of a file in blocks of `size` bytes."""
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _append(self, name, chunks):
+        """Append local data to the writable pack and point the index at it."""
+        with self._packs_locked():
+            pack = self._writable_pack()
+            with open(self._pack_path(pack), 'ab') as f:
+                offset = f.tell()
+                try:
+                    for chunk in chunks:
+                        f.write(chunk)
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+                length = f.tell() - offset
+            with self._conn:
+                replaced = self._conn.execute(
+                    "SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (name, pack, offset, length) VALUES (?, ?, ?, ?)",
+                    (name, pack, offset, length))
+        return length, replaced
+
+    def _map(self, pack, end):
+        """Return an mmap of a pack covering at least `end` bytes."""
+        mapped = self._maps.get(pack)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._pack_path(pack), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack] = mapped
+        return mapped
+
+    def read(self, name):
+        """
+        Return the bytes of a stored image.
+
+        Args:
+            name (str): The image name.
+
+        Returns:
+            bytes: The image data.
+
+        Raises:
+            KeyError: If the image is not stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pack, offset, length FROM entries WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            pack, offset, length = row
+            if length == 0:
+                return b''
+            return self._map(pack, offset + length)[offset:offset + length]
+
+    def delete(self, names):
+        """
+        Evict images from the store and compact in the background if worthwhile.
+
+        Args:
+            names (iterable): The names of the images to delete.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM entries WHERE name = ?", ((n,) for n in names))
+        self._maybe_compact()
+
+    def display_path(self, name):
+        """
+        Export an image to a real file so it can be set as the wallpaper.
+
+        Only the currently displayed image is kept in the display folder. The
+        exported file is named after the image, so desktop environments that
+        ignore a repeated path still notice the change.
+
+        Args:
+            name (str): The image name.
+
+        Returns:
+            str: The file path of the exported image.
+        """
+        os.makedirs(self.display_folder, exist_ok=True)
+        path = os.path.join(self.display_folder, name)
+        with open(path + '.part', 'wb') as f:
+            f.write(self.read(name))
+        os.replace(path + '.part', path)
+        for filename in os.listdir(self.display_folder):
+            if filename != name:
+                try:
+                    os.remove(os.path.join(self.display_folder, filename))
+                except OSError:
+                    pass  # Still in use as the wallpaper on some platforms
+        return path
+
+    def _dead_ratios(self):
+        """Return {pack: fraction of dead bytes} for every pack file."""
+        live = dict(self._conn.execute("SELECT pack, SUM(length) FROM entries GROUP BY pack"))
+        ratios = {}
+        for pack in self._pack_ids():
+            size = os.path.getsize(self._pack_path(pack))
+            ratios[pack] = 1.0 if size == 0 else 1.0 - live.get(pack, 0) / size
+        return ratios
+
+    def _maybe_compact(self):
+        """Start a background compaction if a pack has too many dead bytes."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            victims = [p for p, ratio in self._dead_ratios().items() if ratio >= self.compact_ratio]
+            if not victims:
+                return
+            # Stop appending to the victims so their live data can move elsewhere.
+            self._retired.update(victims)
+            self._compactor = threading.Thread(target=self.compact, args=(victims,),
+                                               name='pack-compactor')
+            self._compactor.start()
+
+    def compact(self, packs=None):
+        """
+        Move live images out of the given packs and delete the packs.
+
+        Images are moved one at a time so readers and writers are only blocked
+        for the duration of a single copy.
+
+        Args:
+            packs (list): Pack ids to compact. Default is every pack above the dead byte ratio.
+        """
+        if packs is None:
+            with self._lock:
+                packs = [p for p, r in self._dead_ratios().items() if r >= self.compact_ratio]
+                self._retired.update(packs)
+        moved = 0
+        for pack in packs:
+            with self._lock:
+                entries = self._conn.execute(
+                    "SELECT name, offset, length FROM entries WHERE pack = ?", (pack,)).fetchall()
+            for name, offset, length in entries:
+                with self._packs_locked():
+                    current = self._conn.execute(
+                        "SELECT pack, offset FROM entries WHERE name = ?", (name,)).fetchone()
+                    if current != (pack, offset):
+                        continue  # Deleted or replaced since the scan
+                    data = self._map(pack, offset + length)[offset:offset + length] if length else b''
+                    self._append(name, [data])
+                    moved += 1
+            with self._packs_locked():
+                remaining = self._conn.execute(
+                    "SELECT COUNT(*) FROM entries WHERE pack = ?", (pack,)).fetchone()[0]
+                if remaining:
+                    continue
+                mapped = self._maps.pop(pack, None)
+                if mapped is not None:
+                    mapped.close()
+                os.remove(self._pack_path(pack))
+                self._retired.discard(pack)
+        logging.info(f"Compacted {len(packs)} pack file(s), moved {moved} image(s)",
+                     extra={'event': 'compact', 'packs': len(packs), 'moved': moved})
+
+    def close(self):
+        """Wait for a running compaction and release the pack maps and index."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._conn.close()
+
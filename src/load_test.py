@@ -0,0 +1,131 @@
+"""
+Load test harness for the Wallpaper Changer downloader.
+
+This script drives `ImageManager.download_image` against the offline Reddit
+simulator (or any server given with --base-url) at several concurrency levels
+and reports images per second, bytes per second, images harvested per API call,
+resumed downloads, negative cache hits and a breakdown of failures. Downloads left unfinished by
+truncated responses are resumed in a final pass, as the next scheduled run would.
+Every level runs against a fresh temporary image folder and catalog, so the
+real image collection is never touched.
+
+Example:
+    python load_test.py --concurrency 1 4 16 --downloads 200 --gallery-rate 0.2 --error-rate 0.05 --truncate-rate 0.05
+
+Functions:
+    run_level(config, concurrency, downloads): Run one load level and collect its statistics.
+    main(): Parse arguments, run every level and print the report.
+"""
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from image_manager import ImageManager
+from reddit_simulator import RedditSimulator, SimulatorSettings
+
+
+def run_level(config, concurrency, downloads):
+    """
+    Run `downloads` post fetches spread over `concurrency` threads.
+
+    Args:
+        config (Config): Configuration pointing at the server under test and a scratch data folder.
+        concurrency (int): Number of concurrent download threads.
+        downloads (int): Total number of posts to fetch.
+
+    Returns:
+        dict: Elapsed seconds and the ImageManager statistics counters.
+    """
+    manager = ImageManager(config)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda _: manager.download_post_images(), range(downloads)))
+        manager.resume_partial_downloads()
+        elapsed = time.perf_counter() - start
+        return {'elapsed': elapsed, 'stats': dict(manager.stats)}
+    finally:
+        manager.close()
+
+
+def main():
+    """Run the load test and print a report."""
+    parser = argparse.ArgumentParser(description="Load test the image downloader")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="Concurrency levels to test")
+    parser.add_argument('--downloads', type=int, default=100, help="Posts to fetch per level")
+    parser.add_argument('--base-url', help="Test an already running server instead of starting the simulator")
+    parser.add_argument('--storage-backend', choices=['folder', 'packed'], default='folder')
+    parser.add_argument('--max-download-kbps', type=float, default=0,
+                        help="Throughput cap applied to the (background) downloads under test")
+    parser.add_argument('--estimate-savings', action='store_true',
+                        help="Estimate MB saved from pixel counts instead of a HEAD request per rendition")
+    parser.add_argument('--fixture-dir', help="Recorded fixtures for the built-in simulator")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--slow-stream-rate', type=float, default=0.0)
+    parser.add_argument('--truncate-rate', type=float, default=0.0)
+    parser.add_argument('--gallery-rate', type=float, default=0.0)
+    parser.add_argument('--crosspost-rate', type=float, default=0.0)
+    parser.add_argument('--text-post-rate', type=float, default=0.0)
+    parser.add_argument('--dead-link-rate', type=float, default=0.0)
+    parser.add_argument('--no-range-requests', dest='range_requests', action='store_false',
+                        help="Make the simulator ignore Range headers")
+    parser.add_argument('--image-size', type=int, default=512 * 1024)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="Show downloader log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    simulator = None
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+    else:
+        settings = SimulatorSettings(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate, slow_stream_rate=args.slow_stream_rate,
+            truncate_rate=args.truncate_rate, image_size=args.image_size, gallery_rate=args.gallery_rate,
+            crosspost_rate=args.crosspost_rate, text_post_rate=args.text_post_rate,
+            dead_link_rate=args.dead_link_rate, range_requests=args.range_requests, seed=args.seed)
+        simulator = RedditSimulator(settings, fixture_dir=args.fixture_dir).start()
+        base_url = simulator.base_url
+
+    print(f"Target: {base_url}, {args.downloads} posts per level, {args.storage_backend} storage\n")
+    print(f"{'threads':>7} {'seconds':>8} {'images/s':>9} {'MB/s':>7} {'MB saved':>8} {'img/call':>8} {'ok':>5} {'resumed':>7} {'cached':>6} {'failed':>6}  failures")
+    try:
+        for concurrency in args.concurrency:
+            workdir = tempfile.mkdtemp(prefix='suppap_load_')
+            try:
+                config = Config(workdir)
+                config.REDDIT_BASE_URL = base_url
+                config.STORAGE_BACKEND = args.storage_backend
+                config.MAX_DOWNLOAD_KBPS = args.max_download_kbps
+                config.MEASURE_RENDITION_SAVINGS = not args.estimate_savings
+                result = run_level(config, concurrency, args.downloads)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            stats, elapsed = result['stats'], result['elapsed']
+            # Estimated savings are marked with ~ and omit full-size renditions
+            saved = (f"{stats.get('bytes_saved', 0) / 1e6:.2f}" if config.MEASURE_RENDITION_SAVINGS
+                     else f"~{stats.get('bytes_saved_estimated', 0) / 1e6:.2f}")
+            failures = {k.split(':', 1)[1]: v for k, v in stats.items() if k.startswith('failed:')}
+            breakdown = ', '.join(f"{cause}={count}" for cause, count in sorted(failures.items())) or '-'
+            print(f"{concurrency:>7} {elapsed:>8.2f} {stats.get('images', 0) / elapsed:>9.1f} "
+                  f"{stats.get('bytes', 0) / elapsed / 1e6:>7.2f} {saved:>8} "
+                  f"{stats.get('images', 0) / max(stats.get('api_calls', 0), 1):>8.2f} {stats.get('images', 0):>5} "
+                  f"{stats.get('resumed', 0):>7} {stats.get('negative_cache_hits', 0):>6} {sum(failures.values()):>6}  {breakdown}")
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+if __name__ == "__main__":
+    main()
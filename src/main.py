@@ -6,7 +6,8 @@ It sets up the scheduled task for changing wallpapers and handles command-line a
 
 Functions:
     parse_arguments(): Parse command-line arguments.
-    main(): The main function that runs the application.
+    run(args): Run the command selected on the command line.
+    main(): The main function that runs the application, optionally under the profiler.
 
 Classes:
     WallpaperManager: Manages the wallpaper changing functionality and scheduling.
@@ -14,15 +15,19 @@ Classes:
 
 import argparse
 import json
+import logging
 import os
+import sys
+from bandwidth import BACKGROUND, FOREGROUND
 from config import Config
-from utils import Logger, OSCompatibilityChecker
+from utils import Logger, OSCompatibilityChecker, setup_logging
 from scheduler import TaskScheduler
 from wallpaper_changer import WallpaperChanger
+from profiling import MemoryBudgetExceeded, RunProfiler
 import traceback
-import datetime
 
-CONFIG_FILE = "wallpaper_config.json"
+# Next to this script, like the log file: scheduled runs start in $HOME (cron) or / (launchd)
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wallpaper_config.json")
 
 class WallpaperManager:
     """
@@ -35,11 +40,11 @@ class WallpaperManager:
     def __init__(self):
         """Initialize the WallpaperManager with necessary components."""
         self.config = Config()
+        self.load_config()
         self.logger = Logger()
         self.os = OSCompatibilityChecker.check_os_compatibility()
         self.scheduler = TaskScheduler(self.os)
-        self.wallpaper_changer = WallpaperChanger()
-        self.load_config()
+        self.wallpaper_changer = WallpaperChanger(self.config)
 
     def load_config(self):
         """Load configuration from the config file if it exists."""
@@ -50,14 +55,28 @@ class WallpaperManager:
                 self.config.SUBREDDITS = saved_config.get('subreddits', self.config.SUBREDDITS)
                 self.config.IMAGE_LIMIT = saved_config.get('image_limit', 100)
                 self.config.MIN_RESOLUTION = saved_config.get('min_resolution', (1920, 1080))
+                self.config.REDDIT_BASE_URL = saved_config.get('reddit_base_url', self.config.REDDIT_BASE_URL)
+                self.config.MAX_DOWNLOAD_KBPS = saved_config.get('max_download_kbps', self.config.MAX_DOWNLOAD_KBPS)
+                self.config.DAILY_QUOTA_MB = saved_config.get('daily_quota_mb', self.config.DAILY_QUOTA_MB)
+                self.config.STORAGE_BACKEND = saved_config.get('storage_backend', self.config.STORAGE_BACKEND)
+                self.config.SUBREDDIT_PRIORITIES = saved_config.get('subreddit_priorities', self.config.SUBREDDIT_PRIORITIES)
+                self.config.LOG_LEVEL = saved_config.get('log_level', self.config.LOG_LEVEL)
+                self.config.LOG_JSON = saved_config.get('log_json', self.config.LOG_JSON)
 
     def save_config(self):
         """Save current configuration to the config file."""
         config_data = {
             'interval': self.config.WALLPAPER_CHANGE_INTERVAL,
             'subreddits': self.config.SUBREDDITS,
+            'subreddit_priorities': self.config.SUBREDDIT_PRIORITIES,
             'image_limit': getattr(self.config, 'IMAGE_LIMIT', 100),
-            'min_resolution': getattr(self.config, 'MIN_RESOLUTION', (1920, 1080))
+            'min_resolution': getattr(self.config, 'MIN_RESOLUTION', (1920, 1080)),
+            'reddit_base_url': self.config.REDDIT_BASE_URL,
+            'max_download_kbps': self.config.MAX_DOWNLOAD_KBPS,
+            'daily_quota_mb': self.config.DAILY_QUOTA_MB,
+            'storage_backend': self.config.STORAGE_BACKEND,
+            'log_level': self.config.LOG_LEVEL,
+            'log_json': self.config.LOG_JSON
         }
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config_data, f, indent=4)
@@ -96,10 +115,14 @@ class WallpaperManager:
         self.cleanup()
 
     def change_now(self):
-        """Change wallpaper immediately."""
-        self.wallpaper_changer.change_wallpaper()
+        """Change wallpaper immediately, downloading at foreground priority if needed."""
+        self.wallpaper_changer.change_wallpaper(priority=FOREGROUND)
         self.logger.log_message("Wallpaper changed manually")
 
+    def scheduled_change(self):
+        """Change wallpaper on behalf of the scheduler, within the bandwidth limits."""
+        self.wallpaper_changer.change_wallpaper(priority=BACKGROUND)
+
     def update_interval(self, interval):
         """Update the wallpaper change interval."""
         self.config.WALLPAPER_CHANGE_INTERVAL = interval
@@ -119,6 +142,12 @@ class WallpaperManager:
         self.save_config()
         self.logger.log_message(f"Removed subreddits: {', '.join(subreddits)}")
 
+    def set_subreddit_priority(self, subreddit, priority):
+        """Set how strongly images from a subreddit are favored during selection."""
+        self.config.SUBREDDIT_PRIORITIES = dict(self.config.SUBREDDIT_PRIORITIES, **{subreddit: priority})
+        self.save_config()
+        self.logger.log_message(f"Set priority of r/{subreddit} to {priority}")
+
     def set_image_limit(self, limit):
         """Set the maximum number of images to store."""
         self.config.IMAGE_LIMIT = limit
@@ -131,19 +160,65 @@ class WallpaperManager:
         self.save_config()
         self.logger.log_message(f"Set minimum resolution to {resolution}")
 
+    def set_reddit_base_url(self, base_url):
+        """Set the Reddit API base URL, e.g. to point at a local simulator."""
+        self.config.REDDIT_BASE_URL = base_url.rstrip('/')
+        self.save_config()
+        self.logger.log_message(f"Set Reddit base URL to {self.config.REDDIT_BASE_URL}")
+
+    def set_max_download_rate(self, kbps):
+        """Cap the throughput of background image downloads (0 for no limit)."""
+        self.config.MAX_DOWNLOAD_KBPS = kbps
+        self.save_config()
+        self.logger.log_message(f"Set maximum download rate to {kbps} KB/s")
+
+    def set_daily_quota(self, megabytes):
+        """Set the rolling 24 hour download allowance for background refills (0 for no limit)."""
+        self.config.DAILY_QUOTA_MB = megabytes
+        self.save_config()
+        self.logger.log_message(f"Set daily download quota to {megabytes} MB")
+
+    def set_storage_backend(self, backend):
+        """Choose between one file per image and packed image storage."""
+        self.config.STORAGE_BACKEND = backend
+        self.save_config()
+        self.logger.log_message(f"Set storage backend to {backend}")
+
+    def set_log_level(self, level):
+        """Set the logging verbosity."""
+        self.config.LOG_LEVEL = level
+        setup_logging(self.config)
+        self.save_config()
+        self.logger.log_message(f"Set log level to {level}")
+
+    def set_log_format(self, log_format):
+        """Switch between plain text and JSON line log output."""
+        self.config.LOG_JSON = log_format == 'json'
+        setup_logging(self.config)
+        self.save_config()
+        self.logger.log_message(f"Set log format to {log_format}")
+
     def clean_images(self):
-        """Clean up old or invalid images."""
-        # Add implementation for cleaning images
-        self.logger.log_message("Cleaned image directory")
+        """Clean up images beyond the image limit."""
+        evicted = self.wallpaper_changer.image_manager.clean_images()
+        self.logger.log_message(f"Cleaned image directory, evicted {evicted} image(s)")
 
     def show_config(self):
         """Display current configuration."""
         config_info = {
             "Change Interval": f"{self.config.WALLPAPER_CHANGE_INTERVAL} seconds",
             "Subreddits": self.config.SUBREDDITS,
+            "Subreddit Priorities": self.config.SUBREDDIT_PRIORITIES,
             "Image Limit": getattr(self.config, 'IMAGE_LIMIT', 100),
             "Min Resolution": getattr(self.config, 'MIN_RESOLUTION', (1920, 1080)),
-            "Image Folder": self.config.IMAGE_FOLDER
+            "Image Folder": self.config.IMAGE_FOLDER,
+            "Storage Backend": self.config.STORAGE_BACKEND,
+            "Max Download Rate": f"{self.config.MAX_DOWNLOAD_KBPS} KB/s" if self.config.MAX_DOWNLOAD_KBPS else "unlimited",
+            "Daily Quota": f"{self.config.DAILY_QUOTA_MB} MB" if self.config.DAILY_QUOTA_MB else "unlimited",
+            "Reddit Base URL": self.config.REDDIT_BASE_URL,
+            "Log Level": self.config.LOG_LEVEL,
+            "Log Format": "json" if self.config.LOG_JSON else "text",
+            "Log File": self.config.LOG_FILE
         }
         return config_info
 
@@ -168,50 +243,68 @@ def parse_arguments():
     config_group.add_argument('--interval', type=int, help="Set wallpaper change interval in seconds")
     config_group.add_argument('--add-subreddits', nargs='+', help="Add subreddits to download from")
     config_group.add_argument('--remove-subreddits', nargs='+', help="Remove subreddits from the list")
+    config_group.add_argument('--reddit-base-url', metavar='URL',
+                              help="Fetch posts from another Reddit-compatible server (e.g. the offline simulator)")
+    config_group.add_argument('--subreddit-priority', nargs=2, metavar=('SUBREDDIT', 'WEIGHT'),
+                              help="Favor a subreddit when picking wallpapers (1.0 is neutral)")
+    config_group.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                              help="Set logging verbosity")
+    config_group.add_argument('--log-format', choices=['text', 'json'],
+                              help="Write plain text or JSON line log entries")
     
     # Image settings
     image_group = parser.add_argument_group('Image Settings')
     image_group.add_argument('--min-resolution', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
                             help="Set minimum image resolution (width height)")
     image_group.add_argument('--image-limit', type=int, help="Set maximum number of images to store")
+    image_group.add_argument('--max-download-rate', type=float, metavar='KBPS',
+                            help="Cap background image downloads at this many KB/s (0 for no limit)")
+    image_group.add_argument('--daily-quota', type=float, metavar='MB',
+                            help="Stop background refills after this many MB per 24 hours (0 for no limit)")
+    image_group.add_argument('--storage-backend', choices=['folder', 'packed'],
+                            help="Store images as separate files or inside large pack files")
     
     # Information and maintenance
     info_group = parser.add_argument_group('Information and Maintenance')
     info_group.add_argument('--show-config', action='store_true', help="Show current configuration")
     info_group.add_argument('--clean-images', action='store_true', help="Clean up old or invalid images")
+
+    # Profiling
+    profile_group = parser.add_argument_group('Profiling')
+    profile_group.add_argument('--profile', action='store_true',
+                               help="Profile CPU time and memory of the command and write reports")
+    profile_group.add_argument('--profile-dir', metavar='DIR',
+                               help="Folder for per-run profile reports (default: profiles next to main.py)")
+    profile_group.add_argument('--memory-budget', type=float, metavar='MB',
+                               help="Fail a profiled run whose peak traced memory exceeds this many MB")
     
     return parser.parse_args()
 
-def main():
+def run(args, reraise=False):
     """
-    The main function that runs the Wallpaper Changer application.
+    Run the command selected on the command line.
 
-    This function handles command-line arguments and manages the application accordingly.
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+        reraise (bool): Re-raise errors after reporting them, so a profiled run is recorded as failed.
     """
-    args = parse_arguments()
     manager = WallpaperManager()
-    log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wallpaper_changer.log')
+    setup_logging(manager.config)
+    logger = manager.logger
 
     try:
-        with open(log_file, 'a') as f:
-            f.write(f"\n{'='*50}\n")
-            f.write(f"Script started at: {datetime.datetime.now()}\n")
-            f.write(f"Arguments: {vars(args)}\n")
-            f.write(f"Current directory: {os.getcwd()}\n")
-            f.write(f"Script path: {os.path.abspath(__file__)}\n")
+        logger.log_message(f"Script started with arguments: {vars(args)}", event='start',
+                           cwd=os.getcwd(), script=os.path.abspath(__file__))
 
         if args.scheduled_run:
             # This is a scheduled run, just change the wallpaper
-            with open(log_file, 'a') as f:
-                f.write("Executing scheduled run\n")
-            manager.change_now()
-            with open(log_file, 'a') as f:
-                f.write("Scheduled run completed\n")
+            logger.log_message("Executing scheduled run")
+            manager.scheduled_change()
+            logger.log_message("Scheduled run completed")
         elif args.start:
             manager.start()
             print("Wallpaper Changer service started.")
-            with open(log_file, 'a') as f:
-                f.write("Service started\n")
+            logger.log_message("Service started")
         elif args.stop:
             manager.stop()
             print("Wallpaper Changer service stopped.")
@@ -227,12 +320,34 @@ def main():
         elif args.remove_subreddits:
             manager.remove_subreddits(args.remove_subreddits)
             print(f"Removed subreddits: {', '.join(args.remove_subreddits)}")
+        elif args.reddit_base_url:
+            manager.set_reddit_base_url(args.reddit_base_url)
+            print(f"Reddit base URL set to {manager.config.REDDIT_BASE_URL}")
+        elif args.subreddit_priority:
+            subreddit, priority = args.subreddit_priority[0], float(args.subreddit_priority[1])
+            manager.set_subreddit_priority(subreddit, priority)
+            print(f"Priority of r/{subreddit} set to {priority}")
+        elif args.log_level:
+            manager.set_log_level(args.log_level)
+            print(f"Log level set to {args.log_level}")
+        elif args.log_format:
+            manager.set_log_format(args.log_format)
+            print(f"Log format set to {args.log_format}")
         elif args.min_resolution:
             manager.set_min_resolution(tuple(args.min_resolution))
             print(f"Minimum resolution set to {args.min_resolution[0]}x{args.min_resolution[1]}")
         elif args.image_limit:
             manager.set_image_limit(args.image_limit)
             print(f"Image limit set to {args.image_limit}")
+        elif args.max_download_rate is not None:
+            manager.set_max_download_rate(args.max_download_rate)
+            print(f"Maximum download rate set to {args.max_download_rate} KB/s")
+        elif args.daily_quota is not None:
+            manager.set_daily_quota(args.daily_quota)
+            print(f"Daily download quota set to {args.daily_quota} MB")
+        elif args.storage_backend:
+            manager.set_storage_backend(args.storage_backend)
+            print(f"Storage backend set to {args.storage_backend}")
         elif args.show_config:
             config_info = manager.show_config()
             print("\nCurrent Configuration:")
@@ -247,9 +362,38 @@ def main():
     except Exception as e:
         error_msg = f"Error: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
-        with open(log_file, 'a') as f:
-            f.write(f"ERROR: {error_msg}\n")
-        manager.logger.log_message(error_msg)
+        logger.log_message(error_msg, level=logging.ERROR, event='error')
+        if reraise:
+            raise
+
+def main():
+    """
+    The main function that runs the Wallpaper Changer application.
+
+    This function handles command-line arguments and manages the application accordingly.
+    With --profile the whole command runs under cProfile and tracemalloc.
+    """
+    args = parse_arguments()
+    if not args.profile:
+        run(args)
+        return
+
+    profile_options = {'profile', 'profile_dir', 'memory_budget'}
+    command = next((name for name, value in vars(args).items()
+                    if value and name not in profile_options), 'help')
+    profiler = RunProfiler(command, args.profile_dir or Config.PROFILE_FOLDER, args.memory_budget)
+    try:
+        with profiler:
+            run(args, reraise=True)
+    except MemoryBudgetExceeded as e:
+        print(f"Error: {e}")
+        logging.error(str(e), extra={'event': 'memory_budget_exceeded'})
+        sys.exit(1)
+    except Exception:
+        # run() already reported the error; the profile records the run as failed
+        print(f"Profile of the failed run written to {profiler.run_dir}")
+        sys.exit(1)
+    print(f"Profile written to {profiler.run_dir}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
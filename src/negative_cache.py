@@ -0,0 +1,153 @@
+"""
+Negative cache for the Wallpaper Changer application.
+
+This module remembers posts and image URLs that did not yield an image (text
+posts, videos, albums, removed or dead links) together with the failure
+cause, so later runs skip them without another network request. Entries live
+in a small SQLite table and expire after a time to live chosen per cause;
+causes without a time to live, such as timeouts and server errors, are not
+cached at all. A Bloom filter, built in memory on the first lookup of a
+run, answers most lookups for unknown keys without touching the database;
+runs that never look anything up, such as most scheduled wallpaper changes,
+do not pay for building it.
+
+Classes:
+    BloomFilter: A compact, probabilistic set of strings.
+    NegativeCache: Persists failed posts and URLs with per-cause expiry.
+"""
+
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+
+
+class BloomFilter:
+    """
+    A class to test set membership of strings with a fixed amount of memory.
+
+    Lookups may return false positives at roughly the configured error rate,
+    but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Size the filter for the expected number of keys.
+
+        Args:
+            capacity (int): Number of keys the filter is sized for.
+            error_rate (float): Acceptable false positive probability at capacity.
+        """
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing derives all bit positions from a single digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        """Add a key to the filter."""
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class NegativeCache:
+    """
+    A class to persist posts and URLs that failed permanently, with per-cause expiry.
+    """
+
+    def __init__(self, path, ttls, capacity=100000, clock=time.time):
+        """
+        Open (and create if needed) the cache database.
+
+        Args:
+            path (str): The file path of the SQLite database.
+            ttls (dict): Failure cause -> seconds to remember it. Causes not listed are not cached.
+            capacity (int): Number of entries the Bloom filter is sized for.
+            clock (callable): Wall clock time source, in seconds.
+        """
+        self.ttls = ttls
+        self._capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failures ("
+                "key TEXT PRIMARY KEY, cause TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _load_bloom(self):
+        """Drop expired entries and load the remaining keys into a new Bloom filter."""
+        with self._conn:
+            self._conn.execute("DELETE FROM failures WHERE expires <= ?", (self._clock(),))
+        keys = [key for (key,) in self._conn.execute("SELECT key FROM failures")]
+        bloom = BloomFilter(max(self._capacity, 2 * len(keys)))
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def lookup(self, key):
+        """
+        Return the cached failure cause of a key.
+
+        Args:
+            key (str): A post or URL key, see post_key and url_key.
+
+        Returns:
+            str: The failure cause, or None if the key is not cached or has expired.
+        """
+        with self._lock:
+            if self._bloom is None:
+                self._bloom = self._load_bloom()
+        if key not in self._bloom:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT cause FROM failures WHERE key = ? AND expires > ?",
+                                     (key, self._clock())).fetchone()
+        return row[0] if row else None
+
+    def add(self, key, cause):
+        """
+        Remember a failure if its cause has a time to live.
+
+        Args:
+            key (str): A post or URL key, see post_key and url_key.
+            cause (str): The failure cause, e.g. 'not_image' or 'http_404'.
+
+        Returns:
+            bool: Whether the failure was cached.
+        """
+        ttl = self.ttls.get(cause, 0)
+        if ttl <= 0:
+            return False
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO failures (key, cause, expires) VALUES (?, ?, ?)",
+                               (key, cause, self._clock() + ttl))
+            # Without a filter yet, the key is picked up when the first lookup builds it
+            if self._bloom is not None:
+                self._bloom.add(key)
+        return True
+
+    @staticmethod
+    def post_key(post_id):
+        """Return the cache key of a Reddit post."""
+        return f"post:{post_id}"
+
+    @staticmethod
+    def url_key(url):
+        """Return the cache key of an image URL."""
+        return f"url:{url}"
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
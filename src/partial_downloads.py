@@ -0,0 +1,118 @@
+"""
+Partial download tracking for the Wallpaper Changer application.
+
+This module keeps the bytes of interrupted image downloads together with the
+validators (ETag / Last-Modified) the server sent, so a later attempt can
+resume with an HTTP Range request instead of starting over. Partial files
+that were not resumed within their time to live are discarded.
+
+Classes:
+    PartialDownloads: Stores interrupted downloads and their resume metadata.
+"""
+
+import json
+import logging
+import os
+import time
+
+
+class PartialDownloads:
+    """
+    A class to store interrupted downloads and the metadata needed to resume them.
+
+    Each download consists of `<name>.part` with the bytes received so far and
+    `<name>.json` with the source URL, validators and post details.
+    """
+
+    def __init__(self, folder, ttl):
+        """
+        Initialize the partial download folder.
+
+        Args:
+            folder (str): The folder holding partial downloads.
+            ttl (float): Seconds after the last progress at which a partial download expires.
+        """
+        self.folder = folder
+        self.ttl = ttl
+        os.makedirs(folder, exist_ok=True)
+
+    def data_path(self, name):
+        """Return the path of the file holding the received bytes."""
+        return os.path.join(self.folder, name + '.part')
+
+    def _meta_path(self, name):
+        return os.path.join(self.folder, name + '.json')
+
+    def size(self, name):
+        """Return the number of bytes received so far, or 0 if there is no partial file."""
+        try:
+            return os.path.getsize(self.data_path(name))
+        except OSError:
+            return 0
+
+    def get(self, name):
+        """
+        Return the resume metadata of a partial download.
+
+        Args:
+            name (str): The image name.
+
+        Returns:
+            dict: The metadata, or None if there is no usable partial download.
+        """
+        try:
+            with open(self._meta_path(name), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.data_path(name)) or time.time() - meta.get('updated', 0) > self.ttl:
+            self.discard(name)
+            return None
+        return meta
+
+    def save(self, name, meta):
+        """
+        Write the resume metadata of a partial download.
+
+        Args:
+            name (str): The image name.
+            meta (dict): The URL, validators and post details needed to resume.
+        """
+        meta = dict(meta, name=name, updated=time.time())
+        temp_path = self._meta_path(name) + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path(name))
+
+    def discard(self, name):
+        """Delete a partial download and its metadata."""
+        for path in (self.data_path(name), self._meta_path(name)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def pending(self):
+        """
+        Return the metadata of every resumable download, oldest first.
+
+        Expired partial downloads and orphaned files are removed on the way.
+
+        Returns:
+            list: Metadata dicts as written by save().
+        """
+        names = set()
+        for filename in os.listdir(self.folder):
+            base, ext = os.path.splitext(filename)
+            if ext in ('.part', '.json'):
+                names.add(base)
+        pending = []
+        for name in names:
+            meta = self.get(name)
+            if meta is None:
+                self.discard(name)
+                logging.info(f"Discarded expired partial download {name}",
+                             extra={'event': 'partial_expired'})
+            else:
+                pending.append(meta)
+        return sorted(pending, key=lambda m: m['updated'])
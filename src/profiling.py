@@ -0,0 +1,171 @@
+"""
+Profiling support for the Wallpaper Changer application.
+
+This module wraps a command with cProfile and tracemalloc and writes the
+results to a per-run directory, so a real run on a production machine can be
+inspected without attaching external tools.
+
+Each run directory contains:
+    cpu_profile.txt: Call report sorted by cumulative and by own time.
+    cpu_profile.prof: Raw cProfile data for tools such as snakeviz.
+    allocations.txt: Top allocation sites at peak memory and at the end of the run,
+        with tracebacks for the largest.
+    summary.json: Wall time, time spent on peak snapshots, peak traced memory and
+        the memory budget verdict.
+
+Classes:
+    MemoryBudgetExceeded: Raised when a profiled run exceeds its memory budget.
+    RunProfiler: Context manager that profiles CPU time and memory allocations.
+"""
+
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when the peak traced memory of a profiled run exceeds its budget."""
+
+
+class RunProfiler:
+    """
+    A class to profile CPU time and memory allocations of a single command.
+
+    cProfile only sees the thread that entered the context manager, while
+    tracemalloc accounts for allocations made by every thread. Memory that is
+    freed before the run ends (such as a buffered download) would be missing
+    from a snapshot taken at exit, so a sampler thread also snapshots the
+    traced memory once it passes PEAK_FLOOR and whenever it grows past the last
+    snapshot by PEAK_GROWTH. A snapshot costs time proportional to the number
+    of live allocations, so the sampler otherwise only polls the traced total
+    and a run takes a handful of snapshots at most; their time is reported as
+    `snapshot_seconds` in the summary.
+    """
+
+    SAMPLE_INTERVAL = 0.01  # Seconds between polls of the traced memory total
+    PEAK_FLOOR = 16 * 1024 * 1024  # No peak snapshots below 16 MB; the final snapshot covers small runs
+    PEAK_GROWTH = 1.5  # Snapshot again once traced memory exceeds the last snapshot by 50%
+
+    def __init__(self, command, output_folder, memory_budget_mb=None, top=30):
+        """
+        Initialize the profiler.
+
+        Args:
+            command (str): Name of the profiled command, used in the run directory name.
+            output_folder (str): Folder in which the per-run directory is created.
+            memory_budget_mb (float): Maximum allowed peak traced memory in MB, or None.
+            top (int): Number of entries in the call and allocation reports.
+        """
+        self.command = command
+        self.memory_budget_mb = memory_budget_mb
+        self.top = top
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.run_dir = os.path.join(output_folder, f"{stamp}_{os.getpid()}_{command}")
+        self._profile = cProfile.Profile()
+        self._start = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._peak_snapshot = None
+        self._peak_snapshot_bytes = 0
+        self._snapshot_seconds = 0.0
+
+    def __enter__(self):
+        tracemalloc.start(10)
+        self._start = time.perf_counter()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_peak, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._profile.disable()
+        wall_seconds = time.perf_counter() - self._start
+        self._stop.set()
+        self._sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(self.run_dir, exist_ok=True)
+        self._write_cpu_report()
+        if self._peak_snapshot is None:
+            # Memory never passed PEAK_FLOOR; the final snapshot is the best view available
+            self._write_allocation_report(snapshot, current, snapshot)
+        else:
+            self._write_allocation_report(self._peak_snapshot, self._peak_snapshot_bytes, snapshot)
+
+        budget_bytes = self.memory_budget_mb * 1024 * 1024 if self.memory_budget_mb else None
+        within_budget = budget_bytes is None or peak <= budget_bytes
+        summary = {
+            'command': self.command,
+            'wall_seconds': round(wall_seconds, 3),
+            'snapshot_seconds': round(self._snapshot_seconds, 3),
+            'peak_traced_bytes': peak,
+            'memory_budget_bytes': budget_bytes,
+            'within_budget': within_budget,
+            'failed': exc_type is not None,
+            'error': f"{exc_type.__name__}: {exc_value}" if exc_type is not None else None,
+        }
+        with open(os.path.join(self.run_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=4)
+
+        if not within_budget and exc_type is None:
+            raise MemoryBudgetExceeded(
+                f"Peak traced memory {peak / 1024 / 1024:.1f} MB exceeds the budget of "
+                f"{self.memory_budget_mb} MB (see {self.run_dir})")
+        return False
+
+    def _sample_peak(self):
+        """Snapshot traced memory each time it reaches a new high, until the run ends."""
+        threshold = self.PEAK_FLOOR
+        while not self._stop.wait(self.SAMPLE_INTERVAL):
+            current, _peak = tracemalloc.get_traced_memory()
+            if current > threshold:
+                start = time.perf_counter()
+                self._peak_snapshot = tracemalloc.take_snapshot()
+                self._snapshot_seconds += time.perf_counter() - start
+                self._peak_snapshot_bytes = current
+                threshold = current * self.PEAK_GROWTH
+
+    def _write_cpu_report(self):
+        """Write the sorted call report and the raw profile data."""
+        self._profile.dump_stats(os.path.join(self.run_dir, 'cpu_profile.prof'))
+        report = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=report).strip_dirs()
+        report.write("Sorted by cumulative time\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        report.write("\nSorted by own time\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        with open(os.path.join(self.run_dir, 'cpu_profile.txt'), 'w') as f:
+            f.write(report.getvalue())
+
+    def _write_allocation_report(self, peak_snapshot, peak_bytes, final_snapshot):
+        """Write the top allocation sites at peak memory and at the end of the run."""
+        filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, threading.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        )
+        peak_snapshot = peak_snapshot.filter_traces(filters)
+        final_snapshot = final_snapshot.filter_traces(filters)
+        with open(os.path.join(self.run_dir, 'allocations.txt'), 'w') as f:
+            f.write(f"Top {self.top} allocation sites at the highest sampled memory use "
+                    f"({peak_bytes / 1024 / 1024:.1f} MB)\n")
+            for index, stat in enumerate(peak_snapshot.statistics('lineno')[:self.top], 1):
+                f.write(f"#{index}: {stat}\n")
+            f.write("\nTracebacks of the 5 largest allocation sites at that point\n")
+            for stat in peak_snapshot.statistics('traceback')[:5]:
+                f.write(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+                for line in stat.traceback.format():
+                    f.write(f"{line}\n")
+            f.write(f"\nTop {self.top} allocation sites still alive at the end of the run\n")
+            for index, stat in enumerate(final_snapshot.statistics('lineno')[:self.top], 1):
+                f.write(f"#{index}: {stat}\n")
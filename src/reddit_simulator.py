@@ -0,0 +1,450 @@
+"""
+Offline Reddit simulator for the Wallpaper Changer application.
+
+This module runs a local HTTP server that imitates the parts of Reddit the
+application talks to: `/r/<subreddit>/random.json`, the hot/new/top listing
+endpoints and the image files they link to, including gallery and crosspost
+submissions. Posts come from recorded listing
+responses or are generated, and faults such as latency, server errors, 429
+rate limiting, slow streams, truncated bodies and dead image links can be injected so the
+downloader can be load tested without touching the real site. Image
+responses carry an ETag and honour Range/If-Range requests like Reddit's
+CDN, so truncated downloads can be resumed.
+
+Point the application at it with `python main.py --reddit-base-url http://127.0.0.1:8080`.
+
+Classes:
+    SimulatorSettings: Fault injection and fixture settings for the simulator.
+    RedditSimulator: Serves Reddit-like JSON and image payloads from fixtures.
+
+Functions:
+    main(): Run the simulator from the command line.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LISTING_ENDPOINTS = ('random', 'hot', 'new', 'top')
+# Generated originals are 4K; previews follow Reddit's usual rendition widths
+SOURCE_SIZE = (3840, 2160)
+PREVIEW_WIDTHS = (108, 216, 320, 640, 960, 1080)
+# Hosts serving resized renditions; their URLs map to the simulator's /preview/ endpoint
+PREVIEW_HOSTS = ('preview.redd.it', 'external-preview.redd.it')
+
+
+class SimulatorSettings:
+    """
+    A class to hold fixture and fault injection settings for the simulator.
+
+    All rates are probabilities between 0 and 1, applied per request.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 rate_limit_reset=1, slow_stream_rate=0.0, stream_bytes_per_second=65536,
+                 truncate_rate=0.0, image_size=512 * 1024, posts_per_subreddit=200,
+                 gallery_rate=0.0, crosspost_rate=0.0, text_post_rate=0.0, dead_link_rate=0.0,
+                 range_requests=True, seed=None):
+        """
+        Initialize the settings.
+
+        Args:
+            latency (float): Seconds added before every response.
+            jitter (float): Maximum extra random seconds added to the latency.
+            error_rate (float): Probability of answering with HTTP 500.
+            rate_limit_rate (float): Probability of answering an API call with HTTP 429.
+            rate_limit_reset (int): Seconds announced in Retry-After and X-Ratelimit-Reset.
+            slow_stream_rate (float): Probability of streaming an image at a throttled speed.
+            stream_bytes_per_second (int): Throughput of throttled image streams.
+            truncate_rate (float): Probability of closing an image response early.
+            image_size (int): Size in bytes of generated images.
+            posts_per_subreddit (int): Number of generated posts per subreddit.
+            gallery_rate (float): Fraction of generated posts that are galleries.
+            crosspost_rate (float): Fraction of generated posts that are crossposts.
+            text_post_rate (float): Fraction of generated posts without any image.
+            dead_link_rate (float): Fraction of images that always answer with HTTP 404.
+            range_requests (bool): Whether image responses support Range requests.
+            seed (int): Seed for reproducible fixtures and fault decisions.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_reset = rate_limit_reset
+        self.slow_stream_rate = slow_stream_rate
+        self.stream_bytes_per_second = stream_bytes_per_second
+        self.truncate_rate = truncate_rate
+        self.image_size = image_size
+        self.posts_per_subreddit = posts_per_subreddit
+        self.gallery_rate = gallery_rate
+        self.crosspost_rate = crosspost_rate
+        self.text_post_rate = text_post_rate
+        self.dead_link_rate = dead_link_rate
+        self.range_requests = range_requests
+        self.seed = seed
+
+
+class RedditSimulator:
+    """
+    A class to serve Reddit-like API responses and images from local fixtures.
+
+    Can be used as a context manager, which starts the server in a background
+    thread and stops it on exit.
+    """
+
+    def __init__(self, settings=None, host='127.0.0.1', port=0, fixture_dir=None):
+        """
+        Initialize the simulator.
+
+        Args:
+            settings (SimulatorSettings): Fault injection settings. Defaults to no faults.
+            host (str): The interface to listen on.
+            port (int): The port to listen on. 0 picks a free port.
+            fixture_dir (str): Folder with recorded listing responses (*.json) and the
+                images they reference. Posts are generated when omitted.
+        """
+        self.settings = settings or SimulatorSettings()
+        self.rng = random.Random(self.settings.seed)
+        self._rng_lock = threading.Lock()
+        self.posts = {}
+        self.images = {}
+        self.request_counts = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+        if fixture_dir:
+            self._load_fixtures(fixture_dir)
+
+    @property
+    def base_url(self):
+        """Return the base URL clients should use in place of https://www.reddit.com."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def chance(self, probability):
+        """Return True with the given probability using the simulator's random source."""
+        with self._rng_lock:
+            return probability > 0 and self.rng.random() < probability
+
+    def _load_fixtures(self, fixture_dir):
+        """Load recorded listing responses and the images they reference."""
+        for path in sorted(glob.glob(os.path.join(fixture_dir, '*.json'))):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            listings = data if isinstance(data, list) else [data]
+            for listing in listings:
+                for child in listing.get('data', {}).get('children', []):
+                    post = self._offline(child.get('data', {}), fixture_dir)
+                    subreddit = post.get('subreddit', os.path.splitext(os.path.basename(path))[0])
+                    self.posts.setdefault(subreddit.lower(), []).append(post)
+
+    def _offline(self, value, fixture_dir):
+        """
+        Point every absolute URL in recorded fixture data at the simulator.
+
+        Preview, gallery and crosspost URLs are rewritten along with the post
+        URL, so a fixture load test never reaches the real site. Images missing
+        from the fixture folder are served as generated payloads.
+        """
+        if isinstance(value, list):
+            return [self._offline(v, fixture_dir) for v in value]
+        if isinstance(value, dict):
+            return {k: self._offline(v, fixture_dir) for k, v in value.items()}
+        if not isinstance(value, str) or not value.startswith(('http://', 'https://')):
+            return value
+        parsed = urlparse(value)
+        host = parsed.netloc.lower()
+        query = f"?{parsed.query}" if parsed.query else ''
+        if host == 'reddit.com' or host.endswith('.reddit.com'):
+            return f"{{base_url}}{parsed.path}{query}"
+        filename = os.path.basename(parsed.path.rstrip('/')) or 'unnamed'
+        image_path = os.path.join(fixture_dir, filename)
+        if filename not in self.images and os.path.isfile(image_path):
+            with open(image_path, 'rb') as f:
+                self.images[filename] = f.read()
+        if host in PREVIEW_HOSTS:
+            return f"{{base_url}}/preview/{filename}{query}"
+        return f"{{base_url}}/images/{filename}"
+
+    def _generated_posts(self, subreddit):
+        """Return (and create on first use) generated posts for a subreddit."""
+        key = subreddit.lower()
+        # Checked under the lock so concurrent first requests generate the posts only once
+        with self._rng_lock:
+            if key not in self.posts:
+                posts = []
+                for i in range(self.settings.posts_per_subreddit):
+                    post_id = f"{key[:3]}{i:05d}"
+                    post = {
+                        'id': post_id,
+                        'subreddit': subreddit,
+                        'score': self.rng.randint(0, 20000),
+                        'title': f"Simulated post {i}",
+                    }
+                    kind = self.rng.random()
+                    if kind < self.settings.text_post_rate:
+                        post.update(is_self=True, url=f"{{base_url}}/r/{subreddit}/comments/{post_id}/")
+                    elif kind < self.settings.text_post_rate + self.settings.gallery_rate:
+                        post.update(self._generated_gallery(post_id))
+                    elif kind < (self.settings.text_post_rate + self.settings.gallery_rate
+                                 + self.settings.crosspost_rate):
+                        parent = self._generated_image_post(f"x{post_id}")
+                        post.update(url=f"{{base_url}}/r/{subreddit}/comments/{parent['id']}/",
+                                    crosspost_parent_list=[parent])
+                    else:
+                        post.update(self._generated_image_post(post_id))
+                    posts.append(post)
+                self.posts[key] = posts
+            return self.posts[key]
+
+    def _generated_image_post(self, post_id):
+        """Build the fields of a single image post with previews."""
+        filename = f"{post_id}.jpg"
+        return {'id': post_id, 'post_hint': 'image', 'url': f"{{base_url}}/images/{filename}",
+                'preview': {'images': [self._generated_preview(filename)]}}
+
+    def _generated_gallery(self, post_id):
+        """Build the fields of a gallery post with two to five items."""
+        media_metadata = {}
+        items = []
+        for k in range(self.rng.randint(2, 5)):
+            media_id = f"{post_id}m{k}"
+            filename = f"{media_id}.jpg"
+            preview = self._generated_preview(filename)
+            media_metadata[media_id] = {
+                'status': 'valid', 'e': 'Image', 'm': 'image/jpg',
+                's': {'u': preview['source']['url'], 'x': preview['source']['width'],
+                      'y': preview['source']['height']},
+                'p': [{'u': r['url'], 'x': r['width'], 'y': r['height']} for r in preview['resolutions']],
+            }
+            items.append({'media_id': media_id, 'id': k})
+        return {'is_gallery': True, 'url': f"{{base_url}}/gallery/{post_id}",
+                'media_metadata': media_metadata, 'gallery_data': {'items': items}}
+
+    @staticmethod
+    def _generated_preview(filename):
+        """Build a preview entry with HTML-escaped rendition URLs, as Reddit does."""
+        def rendition(width):
+            height = width * SOURCE_SIZE[1] // SOURCE_SIZE[0]
+            return {'url': f"{{base_url}}/preview/{filename}?width={width}&amp;format=pjpg",
+                    'width': width, 'height': height}
+        return {'source': rendition(SOURCE_SIZE[0]),
+                'resolutions': [rendition(w) for w in PREVIEW_WIDTHS]}
+
+    def image_payload(self, filename):
+        """Return the bytes of an image, generating a deterministic payload if needed."""
+        if filename not in self.images:
+            seeded = random.Random(filename)
+            body = bytes(seeded.getrandbits(8) for _ in range(min(self.settings.image_size, 4096)))
+            repeats = self.settings.image_size // len(body) + 1
+            self.images[filename] = (b'\xff\xd8\xff\xe0' + body * repeats)[:self.settings.image_size]
+        return self.images[filename]
+
+    def listing(self, subreddit, endpoint, limit):
+        """
+        Build a listing response in Reddit's format.
+
+        Args:
+            subreddit (str): The requested subreddit.
+            endpoint (str): One of LISTING_ENDPOINTS.
+            limit (int): Maximum number of posts for hot/new/top listings.
+
+        Returns:
+            list or dict: A list of listings for random.json, a single listing otherwise.
+        """
+        posts = self._generated_posts(subreddit)
+        if endpoint == 'random':
+            with self._rng_lock:
+                chosen = [self.rng.choice(posts)] if posts else []
+        elif endpoint == 'top':
+            chosen = sorted(posts, key=lambda p: p.get('score', 0), reverse=True)[:limit]
+        else:
+            chosen = posts[:limit]
+        children = [{'kind': 't3', 'data': self._resolve(post)} for post in chosen]
+        listing = {'kind': 'Listing', 'data': {'children': children, 'after': None}}
+        # Like Reddit, random.json answers with a [post, comments] pair of listings
+        if endpoint == 'random':
+            return [listing, {'kind': 'Listing', 'data': {'children': []}}]
+        return listing
+
+    def _resolve(self, value):
+        """Substitute the simulator's base URL into fixture strings."""
+        if isinstance(value, str):
+            return value.replace('{base_url}', self.base_url)
+        if isinstance(value, list):
+            return [self._resolve(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self._resolve(v) for k, v in value.items()}
+        return value
+
+    def _handler_class(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass  # Keep load test output readable
+
+            def do_GET(self):
+                simulator._handle(self)
+
+            def do_HEAD(self):
+                simulator._handle(self)
+
+        return Handler
+
+    def _handle(self, handler):
+        """Answer a request, applying the configured faults."""
+        settings = self.settings
+        parsed = urlparse(handler.path)
+        parts = [p for p in parsed.path.split('/') if p]
+        with self._rng_lock:
+            self.request_counts[parsed.path] = self.request_counts.get(parsed.path, 0) + 1
+            delay = settings.latency + self.rng.uniform(0, settings.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if self.chance(settings.error_rate):
+            return self._send(handler, 500, b'{"error": 500}', 'application/json')
+
+        if len(parts) == 3 and parts[0] == 'r' and parts[2].endswith('.json'):
+            endpoint = parts[2][:-5]
+            if endpoint not in LISTING_ENDPOINTS:
+                return self._send(handler, 404, b'{"error": 404}', 'application/json')
+            if self.chance(settings.rate_limit_rate):
+                headers = {'Retry-After': str(settings.rate_limit_reset),
+                           'X-Ratelimit-Remaining': '0',
+                           'X-Ratelimit-Used': '100',
+                           'X-Ratelimit-Reset': str(settings.rate_limit_reset)}
+                return self._send(handler, 429, b'{"error": 429, "message": "Too Many Requests"}',
+                                  'application/json', headers)
+            limit = int(parse_qs(parsed.query).get('limit', ['25'])[0])
+            body = json.dumps(self.listing(parts[1], endpoint, limit)).encode()
+            return self._send(handler, 200, body, 'application/json')
+
+        if len(parts) == 2 and parts[0] in ('images', 'preview'):
+            # Dead links stay dead, for the original and all of its previews
+            if random.Random(f"dead:{parts[1]}").random() < settings.dead_link_rate:
+                return self._send(handler, 404, b'Not Found', 'text/plain')
+            body = self.image_payload(parts[1])
+            if parts[0] == 'preview':
+                # Previews are re-encoded at roughly 60% of the original's size and
+                # scale with their pixel count relative to the source
+                width = int(parse_qs(parsed.query).get('width', [SOURCE_SIZE[0]])[0])
+                body = body[:max(1024, len(body) * 6 * width * width // (10 * SOURCE_SIZE[0] ** 2))]
+            status, headers = 200, {}
+            if settings.range_requests:
+                etag = f'"{hashlib.md5(body).hexdigest()[:16]}"'
+                headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+                match = re.fullmatch(r'bytes=(\d+)-', handler.headers.get('Range', ''))
+                if match and handler.headers.get('If-Range', etag) == etag:
+                    offset = int(match.group(1))
+                    if offset >= len(body):
+                        headers['Content-Range'] = f"bytes */{len(body)}"
+                        return self._send(handler, 416, b'', 'text/plain', headers)
+                    status = 206
+                    headers['Content-Range'] = f"bytes {offset}-{len(body) - 1}/{len(body)}"
+                    body = body[offset:]
+            slow = self.chance(settings.slow_stream_rate)
+            truncate = self.chance(settings.truncate_rate)
+            return self._send(handler, status, body, 'image/jpeg', headers, slow=slow, truncate=truncate)
+
+        return self._send(handler, 404, b'Not Found', 'text/plain')
+
+    def _send(self, handler, status, body, content_type, headers=None, slow=False, truncate=False):
+        """Write a response, optionally throttled or cut short."""
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        if truncate:
+            handler.send_header('Connection', 'close')
+        handler.end_headers()
+        if handler.command == 'HEAD':
+            return
+        if truncate:
+            body = body[:len(body) // 2]
+            handler.close_connection = True
+        try:
+            if slow:
+                chunk = max(1, self.settings.stream_bytes_per_second // 10)
+                for i in range(0, len(body), chunk):
+                    handler.wfile.write(body[i:i + chunk])
+                    handler.wfile.flush()
+                    time.sleep(0.1)
+            else:
+                handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='reddit-simulator',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+
+def main():
+    """Run the simulator in the foreground until interrupted."""
+    parser = argparse.ArgumentParser(description="Offline Reddit simulator for load testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fixture-dir', help="Folder with recorded listing JSON files and images")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Maximum random extra latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of HTTP 429 API responses")
+    parser.add_argument('--rate-limit-reset', type=int, default=1, help="Seconds announced by 429 responses")
+    parser.add_argument('--slow-stream-rate', type=float, default=0.0, help="Fraction of throttled image streams")
+    parser.add_argument('--stream-bytes-per-second', type=int, default=65536)
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help="Fraction of truncated image bodies")
+    parser.add_argument('--image-size', type=int, default=512 * 1024, help="Size of generated images in bytes")
+    parser.add_argument('--gallery-rate', type=float, default=0.0, help="Fraction of gallery posts")
+    parser.add_argument('--crosspost-rate', type=float, default=0.0, help="Fraction of crossposts")
+    parser.add_argument('--text-post-rate', type=float, default=0.0, help="Fraction of posts without images")
+    parser.add_argument('--dead-link-rate', type=float, default=0.0, help="Fraction of images answering 404")
+    parser.add_argument('--no-range-requests', dest='range_requests', action='store_false',
+                        help="Ignore Range headers on image requests")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    settings = SimulatorSettings(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, rate_limit_reset=args.rate_limit_reset,
+        slow_stream_rate=args.slow_stream_rate, stream_bytes_per_second=args.stream_bytes_per_second,
+        truncate_rate=args.truncate_rate, image_size=args.image_size, gallery_rate=args.gallery_rate,
+        crosspost_rate=args.crosspost_rate, text_post_rate=args.text_post_rate,
+        dead_link_rate=args.dead_link_rate, range_requests=args.range_requests, seed=args.seed)
+    simulator = RedditSimulator(settings, args.host, args.port, args.fixture_dir)
+    print(f"Reddit simulator listening on {simulator.base_url}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+
+if __name__ == "__main__":
+    main()
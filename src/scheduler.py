@@ -39,7 +39,8 @@ class TaskScheduler:
         with open(batch_path, 'w') as f:
             f.write('@echo off\n')
             f.write(f'cd /d "{script_dir}"\n')
-            f.write(f'python "{script_path}" --scheduled-run >> "{script_dir}\\wallpaper_changer.log" 2>&1\n')
+            # The application writes its own rotating log; only keep the last run's console output
+            f.write(f'python "{script_path}" --scheduled-run > "{script_dir}\\wallpaper_changer_console.log" 2>&1\n')
 
         # Make the batch file executable
         os.chmod(batch_path, 0o755)
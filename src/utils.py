@@ -3,13 +3,112 @@ Utility functions and classes for the Wallpaper Changer application.
 
 This module provides utility classes for logging and OS compatibility checking.
 
+Functions:
+    setup_logging(config): Configure queue-based, size-capped logging for the application.
+    shutdown_logging(): Flush pending log records and stop the background log writer.
+
 Classes:
+    JsonFormatter: Formats log records as one JSON object per line.
     Logger: Handles logging for the application.
     OSCompatibilityChecker: Checks if the current OS is compatible with the application.
 """
 
+import atexit
+import json
 import platform
 import logging
+import logging.handlers
+import queue
+
+# Attributes every LogRecord carries; anything else was passed through `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    A class to format log records as single-line JSON objects.
+
+    Fields passed through the `extra` argument of a logging call (for example
+    `event` or `duration_ms`) are included as top-level keys.
+    """
+
+    def format(self, record):
+        """
+        Format the record as a JSON string.
+
+        Args:
+            record (logging.LogRecord): The record to format.
+
+        Returns:
+            str: The JSON encoded record.
+        """
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+def _formatter(config):
+    """Return the log line formatter selected in the configuration."""
+    if config.LOG_JSON:
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+
+def setup_logging(config):
+    """
+    Configure application-wide logging.
+
+    Records are put on an in-memory queue by the calling thread and written to a
+    size-rotated log file by a background listener thread. Calling this again
+    applies changed verbosity and format settings to the running listener.
+
+    Args:
+        config (Config): The configuration providing the LOG_* settings.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(config.LOG_LEVEL).upper(), logging.INFO))
+    if _listener is not None:
+        # Drain the queue first so records logged before the change keep their format
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.setFormatter(_formatter(config))
+        _listener.start()
+        return
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+    file_handler.setFormatter(_formatter(config))
+
+    log_queue = queue.Queue(-1)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush pending log records and stop the background log writer."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
 
 class Logger:
     """
@@ -17,18 +116,19 @@ class Logger:
     """
 
     def __init__(self):
-        """Initialize the logger with basic configuration."""
-        logging.basicConfig(filename='wallpaper_changer.log', level=logging.INFO,
-                            format='%(asctime)s - %(message)s')
+        """Initialize the logger for the application."""
+        self.logger = logging.getLogger('wallpaper_changer')
 
-    def log_message(self, msg):
+    def log_message(self, msg, level=logging.INFO, **fields):
         """
-        Log a message at the INFO level.
+        Log a message.
 
         Args:
             msg (str): The message to be logged.
+            level (int): The logging level. Default is INFO.
+            **fields: Structured fields (e.g. event, duration_ms) added to JSON log lines.
         """
-        logging.info(msg)
+        self.logger.log(level, msg, extra=fields or None)
 
 class OSCompatibilityChecker:
     """
@@ -11,6 +11,8 @@ Classes:
 import subprocess
 import ctypes
 import os
+import time
+from bandwidth import BACKGROUND
 from image_manager import ImageManager
 from utils import OSCompatibilityChecker, Logger
 from config import Config
@@ -20,28 +22,41 @@ class WallpaperChanger:
     A class to handle changing and restoring desktop wallpapers.
     """
 
-    def __init__(self):
-        """Initialize the WallpaperChanger with necessary components."""
-        self.image_manager = ImageManager()
-        self.config = Config()
+    def __init__(self, config=None):
+        """
+        Initialize the WallpaperChanger with necessary components.
+
+        Args:
+            config (Config): Shared configuration. A default Config is created if omitted.
+        """
+        self.config = config or Config()
+        self.image_manager = ImageManager(self.config)
         self.logger = Logger()
         self.os = OSCompatibilityChecker.check_os_compatibility()
         self.default_wallpaper = self._get_default_wallpaper()
 
-    def change_wallpaper(self):
+    def change_wallpaper(self, priority=BACKGROUND):
         """
         Change the desktop wallpaper to a random image from the collection.
         If no images are available, download a new one.
+
+        Args:
+            priority (str): FOREGROUND when the user asked for the change, so a needed
+                download skips the throughput cap and may overdraw the daily quota.
+                Unattended changes use BACKGROUND.
         """
+        start = time.perf_counter()
         image_path = self.image_manager.get_random_image()
         if not image_path:
             self.logger.log_message("No images found. Downloading a new image.")
-            image_path = self.image_manager.download_image()
-        
+            downloaded = self.image_manager.download_image(priority=priority)
+            if downloaded:
+                image_path = self.image_manager.display_path(downloaded["name"])
+
         if image_path:
             success = self.set_wallpaper(image_path)
             if success:
-                self.log_wallpaper_change(image_path)
+                self.log_wallpaper_change(image_path, time.perf_counter() - start)
             else:
                 self.logger.log_message(f"Failed to set wallpaper: {image_path}")
         else:
@@ -67,14 +82,18 @@ class WallpaperChanger:
             self.logger.log_message(f"Error setting wallpaper: {e}")
             return False
 
-    def log_wallpaper_change(self, image_path):
+    def log_wallpaper_change(self, image_path, duration=None):
         """
         Log the wallpaper change event.
 
         Args:
             image_path (str): The file path of the new wallpaper image.
+            duration (float): Seconds taken to select and set the wallpaper, if known.
         """
-        self.logger.log_message(f"Wallpaper changed to: {image_path}")
+        fields = {'event': 'change', 'image': image_path}
+        if duration is not None:
+            fields['duration_ms'] = round(duration * 1000, 1)
+        self.logger.log_message(f"Wallpaper changed to: {image_path}", **fields)
 
     def restore_default_wallpaper(self):
         """Restore the desktop wallpaper to the default image."""
@@ -1,14 +1,16 @@
-from wallpaper_changer import WallpaperChanger
-from utils import Logger
+from main import WallpaperManager
+from utils import Logger, setup_logging
 
 def main():
+    # WallpaperManager loads the saved settings (bandwidth limits, storage backend, priorities)
+    manager = WallpaperManager()
+    setup_logging(manager.config)
     logger = Logger()
-    changer = WallpaperChanger()
-    
+
     try:
-        changer.change_wallpaper()
+        manager.scheduled_change()
     except Exception as e:
         logger.log_message(f"Error changing wallpaper: {str(e)}")
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
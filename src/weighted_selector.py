@@ -0,0 +1,112 @@
+"""
+Weighted random selection for the Wallpaper Changer application.
+
+This module provides a Fenwick tree (binary indexed tree) over item weights so
+that drawing a weighted random item and changing a single weight both take
+O(log n) time, independent of how large the image library grows. The tree can
+run over an in-memory list or over nodes kept on disk by the image catalog.
+
+Classes:
+    FenwickTree: Prefix sums over a growable array of weights.
+"""
+
+
+class FenwickTree:
+    """
+    A class implementing a Fenwick tree of floating point weights.
+
+    Positions are 0-based for callers; the internal array is 1-based.
+    """
+
+    def __init__(self, weights=(), nodes=None):
+        """
+        Build the tree from initial weights in O(n), or wrap an already built one.
+
+        Args:
+            weights (iterable): Initial weights, one per position.
+            nodes (sequence): An existing internal array, including the unused slot 0,
+                supporting len, indexing, item assignment and append. Used as is
+                instead of building from `weights`, e.g. to keep the tree on disk.
+        """
+        if nodes is not None:
+            self.tree = nodes
+            return
+        self.tree = [0.0]
+        self.tree.extend(float(w) for w in weights)
+        size = len(self.tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, position, delta):
+        """
+        Add delta to the weight at a position.
+
+        Args:
+            position (int): The 0-based position to update.
+            delta (float): The amount to add.
+        """
+        i = position + 1
+        size = len(self.tree)
+        while i < size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def append(self, weight):
+        """
+        Append a new position holding the given weight.
+
+        Args:
+            weight (float): The weight of the new position.
+        """
+        i = len(self.tree)
+        # The new node covers positions (i - lowbit(i), i], so it needs the sum of
+        # the already present part of that range plus its own weight.
+        covered = self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i))
+        self.tree.append(float(weight) + covered)
+
+    def prefix_sum(self, count):
+        """
+        Return the sum of the first `count` weights.
+
+        Args:
+            count (int): Number of leading positions to sum.
+
+        Returns:
+            float: The prefix sum.
+        """
+        total = 0.0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self):
+        """Return the sum of all weights."""
+        return self.prefix_sum(len(self))
+
+    def find(self, target):
+        """
+        Find the position whose cumulative weight range contains target.
+
+        Args:
+            target (float): A value in [0, total()).
+
+        Returns:
+            int: The 0-based position of the first prefix sum exceeding target.
+        """
+        position = 0
+        step = 1 << (len(self).bit_length())
+        while step:
+            nxt = position + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(position, len(self) - 1)
+
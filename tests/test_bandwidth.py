@@ -0,0 +1,82 @@
+# tests/test_bandwidth.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from bandwidth import DailyQuota, TokenBucket
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_throughput_is_capped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1000, clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            bucket.consume(500)
+        # 5000 bytes at 1000 B/s with a one second burst allowance
+        self.assertAlmostEqual(clock.now, 4.0)
+
+    def test_zero_rate_is_unlimited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(0, clock=clock, sleep=clock.sleep)
+        bucket.consume(10 ** 9)
+        self.assertEqual(clock.now, 0.0)
+
+class TestDailyQuota(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "usage.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_usage_persists_across_runs(self):
+        clock = FakeClock(100000.0)
+        quota = DailyQuota(self.path, 1000, clock=clock)
+        quota.record(600)
+        quota.save()
+        quota.close()
+        later = DailyQuota(self.path, 1000, clock=clock)
+        self.assertEqual(later.remaining(), 400)
+        later.close()
+
+    def test_overlapping_runs_add_up(self):
+        clock = FakeClock(100000.0)
+        refill = DailyQuota(self.path, 1000, clock=clock)
+        scheduled = DailyQuota(self.path, 1000, clock=clock)
+        refill.record(300)
+        scheduled.record(200)
+        scheduled.save()
+        refill.save()
+        self.assertEqual(refill.remaining(), 500)
+        self.assertEqual(scheduled.remaining(), 500)
+        refill.close()
+        scheduled.close()
+
+    def test_usage_expires_after_a_day(self):
+        clock = FakeClock(100000.0)
+        quota = DailyQuota(self.path, 1000, clock=clock)
+        quota.record(1000)
+        self.assertEqual(quota.remaining(), 0)
+        clock.now += 25 * 3600
+        self.assertEqual(quota.remaining(), 1000)
+        quota.close()
+
+    def test_no_limit(self):
+        quota = DailyQuota(self.path, 0)
+        self.assertIsNone(quota.remaining())
+        quota.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+# tests/test_image_candidates.py
+
+import shutil
+import tempfile
+import unittest
+from config import Config
+from image_manager import ImageManager
+
+# Trimmed from recorded Reddit API responses; rendition URLs are HTML-escaped as served
+PREVIEW = {"images": [{
+    "source": {"url": "https://preview.redd.it/abc.jpg?width=4032&amp;format=pjpg&amp;s=1", "width": 4032, "height": 3024},
+    "resolutions": [
+        {"url": "https://preview.redd.it/abc.jpg?width=640&amp;crop=smart&amp;s=2", "width": 640, "height": 480},
+        {"url": "https://preview.redd.it/abc.jpg?width=1080&amp;crop=smart&amp;s=3", "width": 1080, "height": 810},
+    ]}]}
+SMALL_PREVIEW = {"images": [{
+    "source": {"url": "https://preview.redd.it/low.jpg?width=1280&amp;s=4", "width": 1280, "height": 720},
+    "resolutions": [{"url": "https://preview.redd.it/low.jpg?width=640&amp;s=5", "width": 640, "height": 360}]}]}
+LARGE_RESOLUTIONS = {"images": [{
+    "source": {"url": "https://preview.redd.it/big.jpg?width=7680&amp;s=6", "width": 7680, "height": 4320},
+    "resolutions": [
+        {"url": "https://preview.redd.it/big.jpg?width=1080&amp;s=7", "width": 1080, "height": 608},
+        {"url": "https://preview.redd.it/big.jpg?width=2160&amp;s=8", "width": 2160, "height": 1215},
+        {"url": "https://preview.redd.it/big.jpg?width=3840&amp;s=9", "width": 3840, "height": 2160},
+    ]}]}
+
+GALLERY = {
+    "id": "gal1", "url": "https://www.reddit.com/gallery/gal1", "is_gallery": True,
+    "gallery_data": {"items": [{"media_id": "m2", "id": 1}, {"media_id": "m1", "id": 2}, {"media_id": "m3", "id": 3}]},
+    "media_metadata": {
+        "m1": {"status": "valid", "e": "Image", "m": "image/jpg",
+               "s": {"u": "https://preview.redd.it/m1.jpg?width=3000&amp;s=a", "x": 3000, "y": 2000},
+               "p": [{"u": "https://preview.redd.it/m1.jpg?width=960&amp;s=b", "x": 960, "y": 640}]},
+        "m2": {"status": "valid", "e": "Image", "m": "image/png",
+               "s": {"u": "https://i.redd.it/m2.png", "x": 1920, "y": 1080},
+               "p": [{"u": "https://preview.redd.it/m2.png?width=640&amp;s=c", "x": 640, "y": 360}]},
+        "m3": {"status": "failed"},
+    },
+}
+ANIMATED_GALLERY_ITEM = {
+    "id": "gal2", "url": "https://www.reddit.com/gallery/gal2",
+    "media_metadata": {"a1": {"status": "valid", "e": "AnimatedImage",
+                              "s": {"gif": "https://i.redd.it/a1.gif", "x": 500, "y": 500}}},
+}
+
+class TestImageCandidates(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manager = ImageManager(Config(self.folder))
+        self.manager.config.MIN_RESOLUTION = (1920, 1080)
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.folder)
+
+    def test_candidates(self):
+        cases = [
+            ("direct i.redd.it link",
+             {"id": "p1", "url": "https://i.redd.it/p1.jpg"},
+             [("p1", "https://i.redd.it/p1.jpg")]),
+            ("extensionless image host",
+             {"id": "p2", "url": "https://i.redd.it/p2"},
+             [("p2", "https://i.redd.it/p2")]),
+            ("post_hint image on another host",
+             {"id": "p3", "url": "https://example.com/photo", "post_hint": "image"},
+             [("p3", "https://example.com/photo")]),
+            ("imgur page", {"id": "p4", "url": "https://imgur.com/AbC12"}, [("p4", "https://i.imgur.com/AbC12.jpg")]),
+            ("www imgur page", {"id": "p5", "url": "https://www.imgur.com/AbC12"},
+             [("p5", "https://i.imgur.com/AbC12.jpg")]),
+            ("mobile imgur page", {"id": "p6", "url": "https://m.imgur.com/AbC12.png"},
+             [("p6", "https://i.imgur.com/AbC12.png")]),
+            ("imgur album", {"id": "p7", "url": "https://imgur.com/a/AbC12"}, []),
+            ("imgur gallery", {"id": "p8", "url": "https://imgur.com/gallery/AbC12"}, []),
+            ("imgur video", {"id": "p9", "url": "https://i.imgur.com/AbC12.gifv"}, []),
+            ("text post", {"id": "p10", "url": "https://www.reddit.com/r/Art/comments/p10/", "is_self": True}, []),
+            ("reddit video", {"id": "p11", "url": "https://v.redd.it/p11", "is_video": True}, []),
+            ("external article", {"id": "p12", "url": "https://example.com/article"}, []),
+            ("gallery keeps gallery order and skips failed items",
+             GALLERY,
+             [("gal1_m2", "https://i.redd.it/m2.png"),
+              ("gal1_m1", "https://preview.redd.it/m1.jpg?width=3000&s=a")]),
+            ("animated gallery items are skipped", ANIMATED_GALLERY_ITEM, []),
+            ("crosspost yields the parent's images",
+             {"id": "x1", "url": "https://www.reddit.com/r/Art/comments/par/",
+              "crosspost_parent_list": [{"id": "par", "url": "https://i.redd.it/par.jpg"}]},
+             [("par", "https://i.redd.it/par.jpg")]),
+            ("crosspost of a gallery",
+             {"id": "x2", "url": "https://www.reddit.com/gallery/gal1", "crosspost_parent_list": [GALLERY]},
+             [("gal1_m2", "https://i.redd.it/m2.png"),
+              ("gal1_m1", "https://preview.redd.it/m1.jpg?width=3000&s=a")]),
+            ("crosspost of a text post",
+             {"id": "x3", "url": "https://www.reddit.com/r/Art/comments/txt/",
+              "crosspost_parent_list": [{"id": "txt", "is_self": True}]},
+             []),
+        ]
+        for name, post, expected in cases:
+            with self.subTest(name):
+                candidates = self.manager.extract_image_candidates(post)
+                self.assertEqual([(c["id"], c["url"]) for c in candidates], expected)
+
+    def test_gallery_renditions(self):
+        by_id = {c["id"]: c for c in self.manager.extract_image_candidates(GALLERY)}
+        # The source is the only rendition large enough and it is the original itself
+        self.assertIsNone(by_id["gal1_m2"]["rendition"])
+        self.assertEqual(by_id["gal1_m1"]["original_url"], "https://preview.redd.it/m1.jpg?width=3000&s=a")
+
+    def test_select_rendition(self):
+        cases = [
+            ("only the source covers the target", PREVIEW,
+             ("https://preview.redd.it/abc.jpg?width=4032&format=pjpg&s=1", 4032, 3024)),
+            ("smallest sufficient resolution wins", LARGE_RESOLUTIONS,
+             ("https://preview.redd.it/big.jpg?width=2160&s=8", 2160, 1215)),
+            ("nothing covers the target", SMALL_PREVIEW, None),
+            ("no preview", None, None),
+        ]
+        for name, preview, expected in cases:
+            with self.subTest(name):
+                post = {"id": "p", "url": "https://i.redd.it/p.jpg"}
+                if preview:
+                    post["preview"] = preview
+                rendition = self.manager.select_rendition(post)
+                actual = (rendition["url"], rendition["width"], rendition["height"]) if rendition else None
+                self.assertEqual(actual, expected)
+
+    def test_gifs_keep_their_original(self):
+        post = {"id": "g", "url": "https://i.redd.it/g.gif", "preview": LARGE_RESOLUTIONS}
+        self.assertIsNone(self.manager.select_rendition(post))
+
+    def test_rendition_is_downloaded_instead_of_original(self):
+        post = {"id": "p", "url": "https://i.redd.it/big.jpg", "preview": LARGE_RESOLUTIONS}
+        candidate, = self.manager.extract_image_candidates(post)
+        self.assertEqual(candidate["url"], "https://preview.redd.it/big.jpg?width=2160&s=8")
+        self.assertEqual(candidate["original_url"], "https://i.redd.it/big.jpg")
+        self.assertEqual((candidate["rendition"]["source_width"], candidate["rendition"]["source_height"]),
+                         (7680, 4320))
+
+    def test_rendition_savings_are_estimated(self):
+        rendition = {"width": 2160, "height": 1215, "source_width": 4320, "source_height": 2430}
+        with self.assertLogs(level="INFO") as logs:
+            self.manager._log_rendition_savings(rendition, "https://i.redd.it/big.jpg", 1000)
+        self.assertEqual(self.manager.stats["bytes_saved_estimated"], 3000)
+        self.assertNotIn("bytes_saved", self.manager.stats)
+        self.assertEqual(logs.records[0].bytes_saved_estimated, 3000)
+
+    def test_savings_of_full_size_renditions_are_unknown(self):
+        rendition = {"width": 1920, "height": 1080, "source_width": 1920, "source_height": 1080}
+        with self.assertLogs(level="INFO") as logs:
+            self.manager._log_rendition_savings(rendition, "https://i.redd.it/p.jpg", 1000)
+        self.assertEqual(self.manager.stats, {})
+        self.assertIn("savings unknown", logs.output[0])
+        self.assertFalse(hasattr(logs.records[0], "bytes_saved"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_image_catalog.py
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from image_catalog import ImageCatalog
+
+class TestImageCatalogSampling(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "catalog.db")
+        self.catalog = ImageCatalog(self.path)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.folder)
+
+    def _draws(self, count, seed):
+        rng = random.Random(seed)
+        return [self.catalog.sample(rng)[0] for _ in range(count)]
+
+    def test_zero_weight_images_are_never_sampled(self):
+        self.catalog.add("a", "Art", weight=1.0)
+        self.catalog.add("b", "Art", weight=0.0)
+        self.catalog.add("c", "Art", weight=1.0)
+        self.assertNotIn("b", set(self._draws(500, 1)))
+
+    def test_sampling_follows_weights(self):
+        self.catalog.add("light", "Art", weight=1.0)
+        self.catalog.add("heavy", "Art", weight=9.0)
+        # Expect roughly 90% heavy draws
+        self.assertGreater(self._draws(5000, 42).count("heavy"), 4300)
+
+    def test_removed_slots_are_reused(self):
+        self.catalog.add("a", "Art", weight=1.0)
+        self.catalog.add("b", "Art", weight=1.0)
+        self.catalog.remove(["a"])
+        self.catalog.add("c", "Art", weight=2.0)
+        self.assertEqual(set(self._draws(100, 7)), {"b", "c"})
+        self.assertEqual(len(self.catalog), 2)
+        self.assertAlmostEqual(self.catalog._tree.total(), 3.0)
+        self.assertEqual(len(self.catalog._tree), 2)
+
+    def test_tree_persists_across_runs(self):
+        self.catalog.add("a", "Art", weight=0.0)
+        self.catalog.add("b", "Art", weight=1.0)
+        self.catalog.close()
+        self.catalog = ImageCatalog(self.path)
+        self.assertEqual(set(self._draws(50, 3)), {"b"})
+
+    def test_rebuild_only_when_settings_change(self):
+        self.catalog.add("a", "Art", score=1, weight=1.0)
+        self.catalog.add("b", "Pics", score=1, weight=1.0)
+        self.assertTrue(self.catalog.rebuild_weights(lambda subreddit, score: subreddit == "Pics", "v2"))
+        self.assertFalse(self.catalog.rebuild_weights(lambda subreddit, score: 1.0, "v2"))
+        self.assertEqual(set(self._draws(50, 5)), {"b"})
+
+    def test_empty_catalog_returns_none(self):
+        self.assertIsNone(self.catalog.sample())
+
+    def test_catalogs_sharing_a_database(self):
+        # Two processes, e.g. a scheduled run overlapping a refill
+        other = ImageCatalog(self.path)
+        try:
+            self.catalog.add("a", "Art", weight=1.0)
+            other.add("b", "Art", weight=2.0)
+            self.catalog.add("c", "Art", weight=4.0)
+            other.remove(["a"])
+            self.catalog.add("d", "Art", weight=8.0)
+            self.assertAlmostEqual(self.catalog._tree.total(), 14.0)
+            self.assertAlmostEqual(other._tree.total(), 14.0)
+            self.assertEqual(set(self._draws(500, 11)), {"b", "c", "d"})
+        finally:
+            other.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# tests/test_image_store.py
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from config import Config
+from image_manager import ImageManager
+from image_store import FolderImageStore, PackedImageStore
+
+def failing_chunks():
+    yield b"partial"
+    raise IOError("connection dropped")
+
+class TestFolderImageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store = FolderImageStore(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_interrupted_put_leaves_nothing_behind(self):
+        with self.assertRaises(IOError):
+            self.store.put("a.jpg", failing_chunks())
+        self.assertEqual(os.listdir(self.folder), [])
+
+class TestPackedImageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store = PackedImageStore(os.path.join(self.folder, "packs"),
+                                      os.path.join(self.folder, "display"), pack_size=64)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.folder)
+
+    def test_put_and_read_round_trip(self):
+        self.store.put("a.jpg", [b"abc", b"def"])
+        self.store.put("b.jpg", [b"xyz"])
+        self.assertEqual(self.store.read("a.jpg"), b"abcdef")
+        self.assertEqual(self.store.read("b.jpg"), b"xyz")
+        self.assertEqual(self.store.names(), {"a.jpg", "b.jpg"})
+
+    def test_interrupted_put_is_truncated(self):
+        self.store.put("a.jpg", [b"abc"])
+        with self.assertRaises(IOError):
+            self.store.put("b.jpg", failing_chunks())
+        self.assertNotIn("b.jpg", self.store)
+        self.assertEqual(os.path.getsize(os.path.join(self.folder, "packs", "pack_00001.pack")), 3)
+
+    def test_slow_put_does_not_block_readers(self):
+        self.store.put("a.jpg", [b"abc"])
+        release = threading.Event()
+
+        def slow_chunks():
+            yield b"first"
+            release.wait(5)
+            yield b"second"
+
+        writer = threading.Thread(target=self.store.put, args=("b.jpg", slow_chunks()))
+        writer.start()
+        try:
+            start = time.perf_counter()
+            self.assertIn("a.jpg", self.store)
+            self.assertEqual(self.store.read("a.jpg"), b"abc")
+            self.assertNotIn("b.jpg", self.store)
+            self.assertLess(time.perf_counter() - start, 1.0)
+        finally:
+            release.set()
+            writer.join()
+        self.assertEqual(self.store.read("b.jpg"), b"firstsecond")
+
+    def test_interrupted_put_keeps_partial_data(self):
+        partial = os.path.join(self.folder, "b.jpg.partial")
+        with self.assertRaises(IOError):
+            self.store.put("b.jpg", failing_chunks(), partial_path=partial)
+        with open(partial, "rb") as f:
+            self.assertEqual(f.read(), b"partial")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.folder, "packs"))), ["index.db"])
+
+    def test_stores_sharing_a_folder(self):
+        # Two processes, e.g. a scheduled run overlapping the refill started by --start
+        other = PackedImageStore(os.path.join(self.folder, "packs"),
+                                 os.path.join(self.folder, "display"), pack_size=64)
+        try:
+            def write(store, prefix):
+                for i in range(20):
+                    store.put(f"{prefix}{i}.jpg", [prefix.encode() * 5, bytes([i]) * 5])
+
+            threads = [threading.Thread(target=write, args=(store, prefix))
+                       for store, prefix in ((self.store, "a"), (other, "b"))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for prefix in "ab":
+                for i in range(20):
+                    self.assertEqual(other.read(f"{prefix}{i}.jpg"), prefix.encode() * 5 + bytes([i]) * 5)
+        finally:
+            other.close()
+
+    def test_eviction_compacts_packs(self):
+        for i in range(6):
+            self.store.put(f"{i}.jpg", [bytes([i]) * 40])
+        self.store.delete([f"{i}.jpg" for i in range(5)])
+        self.store._compactor.join()
+        self.assertEqual(self.store.read("5.jpg"), bytes([5]) * 40)
+        packs = [f for f in os.listdir(os.path.join(self.folder, "packs")) if f.endswith(".pack")]
+        # Only the pack now holding the surviving image remains
+        self.assertEqual(len(packs), 1)
+
+    def test_display_path_exports_only_current_image(self):
+        self.store.put("a.jpg", [b"aaa"])
+        self.store.put("b.jpg", [b"bbb"])
+        self.store.display_path("a.jpg")
+        path = self.store.display_path("b.jpg")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"bbb")
+        self.assertEqual(os.listdir(os.path.join(self.folder, "display")), ["b.jpg"])
+
+class TestBackendCatalogs(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _manager(self, backend):
+        config = Config(self.folder)
+        config.STORAGE_BACKEND = backend
+        return ImageManager(config)
+
+    def test_run_on_other_backend_keeps_catalog(self):
+        packed = self._manager("packed")
+        packed.store.put("Art_a.jpg", [b"aaa"])
+        packed.catalog.add("Art_a.jpg", "Art", score=500, weight=1.0)
+        packed.close()
+        # E.g. a scheduled run that did not pick up the packed storage setting
+        folder = self._manager("folder")
+        folder.reconcile_catalog()
+        self.assertIsNone(folder.get_random_image())
+        folder.close()
+        packed = self._manager("packed")
+        try:
+            self.assertEqual([entry[:3] for entry in packed.catalog.entries()], [("Art_a.jpg", "Art", 500)])
+        finally:
+            packed.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# tests/test_negative_cache.py
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from config import Config
+from image_manager import ImageManager
+from negative_cache import BloomFilter, NegativeCache
+from reddit_simulator import RedditSimulator
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f"url:{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"url:{i}")
+        false_positives = sum(f"post:{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+class TestNegativeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "negative.db")
+        self.clock = FakeClock(1000.0)
+        self.ttls = {'not_image': 100, 'http_404': 10}
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_entries_expire_per_cause(self):
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        cache.add("post:a", "not_image")
+        cache.add("url:b", "http_404")
+        self.clock.now += 50
+        self.assertEqual(cache.lookup("post:a"), "not_image")
+        self.assertIsNone(cache.lookup("url:b"))
+        cache.close()
+
+    def test_transient_causes_are_not_cached(self):
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        self.assertFalse(cache.add("url:c", "http_500"))
+        self.assertIsNone(cache.lookup("url:c"))
+        cache.close()
+
+    def test_entries_persist_across_runs(self):
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        cache.add("url:d", "not_image")
+        cache.close()
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        self.assertEqual(cache.lookup("url:d"), "not_image")
+        cache.close()
+
+    def test_filter_is_built_on_first_lookup(self):
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        cache.add("url:e", "http_404")
+        cache.close()
+        cache = NegativeCache(self.path, self.ttls, clock=self.clock)
+        self.assertIsNone(cache._bloom)
+        cache.add("url:f", "not_image")
+        self.assertEqual(cache.lookup("url:e"), "http_404")
+        self.assertEqual(cache.lookup("url:f"), "not_image")
+        self.assertIsNotNone(cache._bloom)
+        cache.close()
+
+class TestImgurCandidates(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manager = ImageManager(Config(self.folder))
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.folder)
+
+    def _urls(self, url):
+        return [c['url'] for c in self.manager.extract_image_candidates({'id': 'x', 'url': url})]
+
+    def test_imgur_extension_is_kept(self):
+        self.assertEqual(self._urls("https://imgur.com/abc.png"), ["https://i.imgur.com/abc.png"])
+        self.assertEqual(self._urls("https://imgur.com/abc"), ["https://i.imgur.com/abc.jpg"])
+
+    def test_imgur_videos_and_albums_are_skipped(self):
+        self.assertEqual(self._urls("https://imgur.com/abc.gifv"), [])
+        self.assertEqual(self._urls("https://i.imgur.com/abc.mp4"), [])
+        self.assertEqual(self._urls("https://imgur.com/a/abc"), [])
+
+class TestPostCache(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.folder = tempfile.mkdtemp()
+        self.fixtures = os.path.join(self.folder, "fixtures")
+        os.makedirs(self.fixtures)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        logging.disable(logging.NOTSET)
+
+    def _fetch_twice(self, post):
+        with open(os.path.join(self.fixtures, "Art.json"), "w") as f:
+            json.dump({"data": {"children": [{"kind": "t3", "data": dict(post, subreddit="Art")}]}}, f)
+        config = Config(os.path.join(self.folder, "data"))
+        config.SUBREDDITS = ["Art"]
+        with RedditSimulator(fixture_dir=self.fixtures) as simulator:
+            config.REDDIT_BASE_URL = simulator.base_url
+            manager = ImageManager(config)
+            try:
+                manager.download_post_images()
+                manager.download_post_images()
+                return dict(manager.stats)
+            finally:
+                manager.close()
+
+    def test_text_post_is_skipped_on_the_next_fetch(self):
+        stats = self._fetch_twice({"id": "t1", "is_self": True})
+        self.assertEqual(stats.get("failed:not_image"), 1)
+        self.assertEqual(stats.get("negative_cache_hits"), 1)
+
+    def test_posts_without_id_are_not_cached(self):
+        stats = self._fetch_twice({"is_self": True})
+        self.assertEqual(stats.get("failed:not_image"), 2)
+        self.assertNotIn("negative_cache_hits", stats)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# tests/test_partial_downloads.py
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from config import Config
+from image_manager import ImageManager
+from partial_downloads import PartialDownloads
+from reddit_simulator import RedditSimulator, SimulatorSettings
+
+class TestPartialDownloads(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.partials = PartialDownloads(self.folder, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, name, data):
+        with open(self.partials.data_path(name), 'wb') as f:
+            f.write(data)
+        self.partials.save(name, {'url': 'http://example.com/' + name, 'validator': '"abc"'})
+
+    def test_pending_returns_saved_downloads(self):
+        self._write("a.jpg", b"12345")
+        meta = self.partials.get("a.jpg")
+        self.assertEqual(meta["validator"], '"abc"')
+        self.assertEqual(self.partials.size("a.jpg"), 5)
+        self.assertEqual([m["name"] for m in self.partials.pending()], ["a.jpg"])
+
+    def test_expired_downloads_are_discarded(self):
+        self._write("a.jpg", b"12345")
+        self.partials.ttl = 0
+        time.sleep(0.01)
+        self.assertEqual(self.partials.pending(), [])
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_orphaned_data_is_discarded(self):
+        with open(self.partials.data_path("b.jpg"), 'wb') as f:
+            f.write(b"123")
+        self.assertEqual(self.partials.pending(), [])
+        self.assertEqual(os.listdir(self.folder), [])
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.folder = tempfile.mkdtemp()
+        self.settings = SimulatorSettings(truncate_rate=1.0, image_size=200000, seed=1)
+        self.simulator = RedditSimulator(self.settings).start()
+        self.config = Config(self.folder)
+        self.config.REDDIT_BASE_URL = self.simulator.base_url
+
+    def tearDown(self):
+        self.simulator.stop()
+        shutil.rmtree(self.folder)
+        logging.disable(logging.NOTSET)
+
+    def _fetch_truncated(self, manager):
+        self.assertEqual(manager.download_post_images(), [])
+        pending = manager.partials.pending()
+        self.assertEqual(len(pending), 1)
+        self.settings.truncate_rate = 0.0
+        return pending[0]
+
+    def test_truncated_download_is_resumed(self):
+        self._check_resume()
+
+    def test_truncated_download_is_resumed_into_packs(self):
+        self.config.STORAGE_BACKEND = "packed"
+        self._check_resume()
+
+    def _check_resume(self):
+        manager = ImageManager(self.config)
+        try:
+            meta = self._fetch_truncated(manager)
+            received = manager.partials.size(meta["name"])
+            images = manager.resume_partial_downloads()
+            self.assertEqual(len(images), 1)
+            self.assertEqual(manager.stats["resumed"], 1)
+            self.assertEqual(manager.stats["bytes_resumed"], received)
+            expected = self.simulator.image_payload(meta["url"].rsplit('/', 1)[1].split('?')[0])
+            data = manager.store.read(images[0]["name"])
+            # Only the missing bytes were transferred again
+            self.assertEqual(len(data), received + manager.stats["bytes"])
+            self.assertTrue(expected.startswith(data))
+            self.assertEqual(manager.partials.pending(), [])
+        finally:
+            manager.close()
+
+    def test_complete_download_leaves_no_partial_files(self):
+        self.settings.truncate_rate = 0.0
+        manager = ImageManager(self.config)
+        try:
+            self.assertEqual(len(manager.download_post_images()), 1)
+            self.assertEqual(os.listdir(self.config.PARTIAL_FOLDER), [])
+        finally:
+            manager.close()
+
+    def test_full_download_without_range_support(self):
+        manager = ImageManager(self.config)
+        try:
+            self._fetch_truncated(manager)
+            self.settings.range_requests = False
+            images = manager.resume_partial_downloads()
+            self.assertEqual(len(images), 1)
+            self.assertNotIn("resumed", manager.stats)
+        finally:
+            manager.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# tests/test_profiling.py
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+from profiling import RunProfiler
+
+def buffer_and_release():
+    data = bytearray(20 * 1024 * 1024)
+    time.sleep(0.1)
+    return len(data)
+
+class TestRunProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _read(self, profiler, filename):
+        with open(os.path.join(profiler.run_dir, filename)) as f:
+            return f.read()
+
+    def test_freed_peak_allocations_are_reported(self):
+        profiler = RunProfiler("test", self.folder)
+        with profiler:
+            buffer_and_release()
+        peak_section = self._read(profiler, "allocations.txt").split("still alive at the end")[0]
+        self.assertIn("test_profiling.py", peak_section.splitlines()[1])
+
+    def test_snapshots_are_capped(self):
+        profiler = RunProfiler("test", self.folder)
+        with patch("profiling.tracemalloc.take_snapshot", wraps=tracemalloc.take_snapshot) as take_snapshot:
+            with profiler:
+                keep = []
+                for _ in range(40):
+                    keep.append(bytearray(1024 * 1024))
+                    time.sleep(0.005)
+        # One snapshot each at 16+, 24+ and 36+ MB, plus the final one
+        self.assertLessEqual(take_snapshot.call_count, 4)
+        summary = json.loads(self._read(profiler, "summary.json"))
+        self.assertGreater(summary["snapshot_seconds"], 0)
+
+    def test_small_runs_only_take_the_final_snapshot(self):
+        profiler = RunProfiler("test", self.folder)
+        with patch("profiling.tracemalloc.take_snapshot", wraps=tracemalloc.take_snapshot) as take_snapshot:
+            with profiler:
+                sum(range(100000))
+        self.assertEqual(take_snapshot.call_count, 1)
+
+    def test_failed_runs_are_recorded(self):
+        profiler = RunProfiler("test", self.folder)
+        with self.assertRaises(RuntimeError):
+            with profiler:
+                raise RuntimeError("boom")
+        summary = json.loads(self._read(profiler, "summary.json"))
+        self.assertTrue(summary["failed"])
+        self.assertEqual(summary["error"], "RuntimeError: boom")
+
+if __name__ == "__main__":
+    unittest.main()
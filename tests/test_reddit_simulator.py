@@ -0,0 +1,76 @@
+# tests/test_reddit_simulator.py
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from reddit_simulator import RedditSimulator, SimulatorSettings
+
+class TestFixtures(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        preview = {"images": [{"source": {"url": "https://preview.redd.it/abc.jpg?width=3840&amp;s=1",
+                                          "width": 3840, "height": 2160},
+                               "resolutions": [{"url": "https://preview.redd.it/abc.jpg?width=1080&amp;s=2",
+                                                "width": 1080, "height": 608}]}]}
+        gallery = {"id": "gal", "url": "https://www.reddit.com/gallery/gal",
+                   "media_metadata": {"m1": {"status": "valid", "e": "Image",
+                                             "s": {"u": "https://preview.redd.it/m1.jpg?width=3840", "x": 3840, "y": 2160},
+                                             "p": [{"u": "https://preview.redd.it/m1.jpg?width=640", "x": 640, "y": 360}]}}}
+        crosspost = {"id": "xp", "url": "https://www.reddit.com/r/Art/comments/par/",
+                     "crosspost_parent_list": [{"id": "par", "url": "https://i.imgur.com/par.png"}]}
+        posts = [{"id": "abc", "url": "https://i.redd.it/abc.jpg", "preview": preview}, gallery, crosspost]
+        listing = {"kind": "Listing", "data": {"children": [{"kind": "t3", "data": p} for p in posts]}}
+        with open(os.path.join(self.folder, "EarthPorn.json"), "w") as f:
+            json.dump(listing, f)
+        with open(os.path.join(self.folder, "abc.jpg"), "wb") as f:
+            f.write(b"recorded")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_every_url_points_at_the_simulator(self):
+        with RedditSimulator(fixture_dir=self.folder) as simulator:
+            body = json.dumps(simulator.listing("EarthPorn", "hot", 10))
+            self.assertNotIn("redd.it", body)
+            self.assertNotIn("imgur.com", body)
+            self.assertNotIn("reddit.com", body)
+            self.assertIn(f"{simulator.base_url}/preview/m1.jpg?width=640", body)
+            self.assertEqual(simulator.image_payload("abc.jpg"), b"recorded")
+
+class TestSmoke(unittest.TestCase):
+
+    def test_rate_limited_listing(self):
+        settings = SimulatorSettings(rate_limit_rate=1.0, rate_limit_reset=7)
+        with RedditSimulator(settings) as simulator:
+            response = requests.get(f"{simulator.base_url}/r/EarthPorn/hot.json", timeout=5)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "7")
+        self.assertEqual(response.headers["X-Ratelimit-Remaining"], "0")
+        self.assertEqual(response.headers["X-Ratelimit-Reset"], "7")
+
+    def test_truncated_image_body(self):
+        settings = SimulatorSettings(truncate_rate=1.0, image_size=50000, seed=1)
+        with RedditSimulator(settings) as simulator:
+            post = simulator.listing("EarthPorn", "hot", 1)["data"]["children"][0]["data"]
+            response = requests.get(post["url"], stream=True, timeout=5)
+            expected = int(response.headers["Content-Length"])
+            received = bytearray()
+            # Depending on the urllib3 version a short body either raises or simply ends early
+            try:
+                for chunk in response.iter_content(8192):
+                    received += chunk
+            except requests.exceptions.ChunkedEncodingError:
+                pass
+            finally:
+                response.close()
+            payload = simulator.image_payload(post["url"].rsplit("/", 1)[1])
+        self.assertEqual(expected, len(payload))
+        self.assertLess(len(received), expected)
+        self.assertTrue(payload.startswith(bytes(received)))
+
+if __name__ == "__main__":
+    unittest.main()
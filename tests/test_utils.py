@@ -0,0 +1,97 @@
+# tests/test_utils.py
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from config import Config
+from utils import JsonFormatter, Logger, setup_logging, shutdown_logging
+
+class TestJsonFormatter(unittest.TestCase):
+
+    def test_extra_fields_become_keys(self):
+        record = logging.makeLogRecord({'msg': "Downloaded %s", 'args': ("a.jpg",), 'levelname': 'INFO',
+                                        'event': 'download', 'duration_ms': 12.5})
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], "Downloaded a.jpg")
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['event'], 'download')
+        self.assertEqual(entry['duration_ms'], 12.5)
+        # Standard record attributes are not repeated
+        self.assertNotIn('lineno', entry)
+        self.assertNotIn('args', entry)
+
+    def test_values_that_are_not_json_are_stringified(self):
+        record = logging.makeLogRecord({'msg': "x", 'path': Config})
+        self.assertIn("Config", json.loads(JsonFormatter().format(record))['path'])
+
+class TestSetupLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.config = Config(self.folder)
+        root = logging.getLogger()
+        self.saved = root.handlers[:], root.level
+
+    def tearDown(self):
+        shutdown_logging()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in self.saved[0]:
+            root.addHandler(handler)
+        root.setLevel(self.saved[1])
+        shutil.rmtree(self.folder)
+
+    def _lines(self, path=None):
+        with open(path or self.config.LOG_FILE, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_records_reach_the_file_through_the_queue(self):
+        setup_logging(self.config)
+        Logger().log_message("Wallpaper changed", event='change')
+        logging.debug("Below the configured level")
+        shutdown_logging()
+        lines = self._lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith(" - INFO - Wallpaper changed"))
+
+    def test_json_lines_carry_extra_fields(self):
+        self.config.LOG_JSON = True
+        setup_logging(self.config)
+        Logger().log_message("Wallpaper changed", event='change', duration_ms=3)
+        shutdown_logging()
+        entry = json.loads(self._lines()[0])
+        self.assertEqual((entry['message'], entry['event'], entry['duration_ms']),
+                         ("Wallpaper changed", 'change', 3))
+
+    def test_second_call_applies_level_and_format(self):
+        setup_logging(self.config)
+        logging.info("plain")
+        self.config.LOG_JSON = True
+        self.config.LOG_LEVEL = 'WARNING'
+        setup_logging(self.config)
+        logging.info("dropped")
+        logging.warning("structured")
+        shutdown_logging()
+        lines = self._lines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith(" - INFO - plain"))
+        self.assertEqual(json.loads(lines[1])['message'], "structured")
+
+    def test_log_file_is_rotated_by_size(self):
+        self.config.LOG_MAX_BYTES = 500
+        self.config.LOG_BACKUP_COUNT = 2
+        setup_logging(self.config)
+        for i in range(100):
+            logging.info(f"Message number {i}")
+        shutdown_logging()
+        files = sorted(f for f in os.listdir(self.folder) if f.startswith("wallpaper_changer.log"))
+        self.assertEqual(files, ["wallpaper_changer.log", "wallpaper_changer.log.1", "wallpaper_changer.log.2"])
+        self.assertTrue(all(os.path.getsize(os.path.join(self.folder, f)) <= 500 for f in files))
+        self.assertTrue(self._lines()[-1].endswith("Message number 99"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+# tests/test_weighted_selector.py
+
+import unittest
+from weighted_selector import FenwickTree
+
+class TestFenwickTree(unittest.TestCase):
+
+    def test_prefix_sums_match_naive_sums(self):
+        weights = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0]
+        tree = FenwickTree(weights)
+        for count in range(len(weights) + 1):
+            self.assertAlmostEqual(tree.prefix_sum(count), sum(weights[:count]))
+
+    def test_append_and_add_keep_sums_consistent(self):
+        tree = FenwickTree()
+        weights = []
+        for w in range(1, 20):
+            tree.append(w)
+            weights.append(w)
+        tree.add(4, 10.0)
+        weights[4] += 10.0
+        for count in range(len(weights) + 1):
+            self.assertAlmostEqual(tree.prefix_sum(count), sum(weights[:count]))
+
+    def test_find_locates_weight_range(self):
+        tree = FenwickTree([1.0, 0.0, 2.0])
+        self.assertEqual(tree.find(0.5), 0)
+        self.assertEqual(tree.find(1.0), 2)
+        self.assertEqual(tree.find(2.9), 2)
+
+if __name__ == "__main__":
+    unittest.main()